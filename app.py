@@ -22,13 +22,27 @@ from dash.exceptions import PreventUpdate
 import collections
 from plotly.validators.scatter.marker import SymbolValidator
 import numpy as np
-import operator as op
 from plotly.subplots import make_subplots
 import plotly
 from dash.exceptions import PreventUpdate
 from collections import namedtuple
 import time
 import plotly.express as px
+import os
+import re
+import concurrent.futures
+import itertools
+import shutil
+import hashlib
+import threading
+import uuid
+import gzip
+import bz2
+import lzma
+import zipfile
+import functools
+import importlib.util
+import urllib.parse
 
 
 external_stylesheets = [dbc.themes.BOOTSTRAP]
@@ -37,6 +51,7 @@ app = dash.Dash(
 )
 
 app.css.append_css({"external_url": external_stylesheets})
+server = app.server
 
 ##########################################Charts########################################################################
 
@@ -44,8 +59,13 @@ panels = {}
 
 
 class Graph:
-    def __init__(self, df: pd.DataFrame()):
+    def __init__(self, df: pd.DataFrame(), data_key=None):
         self.df = df
+        # Identifies the rows in df for caches, None when they are not cached.
+        self.data_key = data_key
+        # Visible axis ranges when zoomed in, y ranges by axis ("yaxis", "yaxis2"), see zoom_traces.
+        self.x_range = None
+        self.y_ranges = {}
         self.traces = []
         self.fig = make_subplots(specs=[[{"secondary_y": True}]])
         self.traces_dict = {}
@@ -78,24 +98,47 @@ class Graph:
 
 
 class Trace(Graph):
-    def __init__(self, trace_name: str, trace_type: str):
+    # Conditional formatting options, the attribute each sets per point and the setting holding
+    # the value outside the condition, see reapply_conditions.
+    conditional_attributes = {}
+
+    def __init__(self, df: pd.DataFrame, trace_name: str, trace_type: str):
         super().__init__(df)
         self.trace_name = trace_name
         self.trace_type = trace_type
         # traces_dict = Graph._traces_dict
 
+    def style(self, trace) -> dict:
+        """Properties of ``trace`` that do not depend on the data, see restyle."""
+        return {}
+
+    def restyle(self, g):
+        """Applies ``style`` to the traces of this trace on ``g`` in place, so a style edit does not
+        rebuild the data arrays."""
+        g.fig.for_each_trace(lambda trace: trace.update(self.style(trace)), selector=dict(name=self.trace_name))
+
 
 class Scatter(Trace):
     """Represents a Scatter Graph trace."""
 
+    conditional_attributes = {
+        'Marker Symbol': ('marker_symbol', 'Marker Symbol'),
+        'Marker Color': ('marker_color', 'Marker Color'),
+        'Marker Size': ('marker_size', 'Marker Size'),
+        'Opacity': ('opacity', 'Opacity'),
+        'Marker Border Width': ('border_width', 'Marker Border Width'),
+        'Marker Border Color': ('border_color', 'Marker Border Color'),
+    }
+
     def __init__(
             self,
+            df: pd.DataFrame,
             x_axis_column_name: str,
             y_axis_dict: dict,
             trace_name: str,
             trace_type: str = "Scatter",
     ) -> object:
-        super().__init__(trace_name, trace_type)
+        super().__init__(df, trace_name, trace_type)
         self.x_axis_column_name = x_axis_column_name
         self.y_axis_dict = y_axis_dict
         self.marker_symbol = "circle"
@@ -104,39 +147,90 @@ class Scatter(Trace):
         self.border_width = 0.0
         self.border_color = "black"
         self.opacity = 1.0
+        # "points" draws every marker, "density" a heatmap of how many points fall in each cell.
+        self.render = "points"
         # traces_dict = Graph._traces_dict
 
     def add_trace(self):
         traces = super().get_traces()
         column = self.y_axis_dict["name"]
         if column not in traces:
-            t = go.Scatter(
+            t = self.density_trace(column) if self.render == "density" else None
+            if t is not None:
+                self.fig.add_trace(t, secondary_y=self.y_axis_dict["dual"])
+                return
+            t = scatter_class(len(self.df))(
                 x=self.df[self.x_axis_column_name],
                 y=self.df[column],
                 mode="markers",
-                marker=dict(
-                    color=self.marker_color,
-                    size=self.marker_size,
-                    opacity=self.opacity,
-                    line=dict(width=self.border_width, color=self.border_color),
-                    symbol=self.marker_symbol,
-                ),
                 name=column,
             )
+            t.update(self.style(t))
             self.fig.add_trace(t, secondary_y=self.y_axis_dict["dual"])
 
+    def style(self, trace) -> dict:
+        if trace.type == "heatmap":
+            color = self.marker_color if isinstance(self.marker_color, str) else "black"
+            return dict(
+                colorscale=[[0, "rgba(255, 255, 255, 0)"], [1, color]],
+                opacity=self.opacity if np.isscalar(self.opacity) else 1.0,
+            )
+        return dict(
+            marker=dict(
+                color=self.marker_color,
+                size=self.marker_size,
+                opacity=self.opacity,
+                line=dict(width=self.border_width, color=self.border_color),
+                symbol=self.marker_symbol,
+            ),
+        )
+
+    def density_trace(self, column: str):
+        """A heatmap of point counts over the visible ranges, or None when an axis is not numeric."""
+        x = self.df[self.x_axis_column_name]
+        y = self.df[column]
+        y_range = self.y_ranges.get("yaxis2" if self.y_axis_dict["dual"] else "yaxis")
+        key = None if self.data_key is None else (
+            self.data_key, x.name, column, DENSITY_BINS, self.x_range, y_range)
+        grid = line_sampler.density(key, x, y, self.x_range, y_range)
+        if grid is None:
+            return None
+        counts, x_centers, y_centers = grid
+        t = go.Heatmap(
+            x=x_centers,
+            y=y_centers,
+            # Empty cells are left transparent.
+            z=np.where(counts > 0, counts, np.nan).T,
+            showscale=False,
+            hoverongaps=False,
+            name=column,
+        )
+        return t.update(self.style(t))
+
 
 class Line(Trace):
     """Represents a Scatter Graph trace."""
 
+    conditional_attributes = {
+        'Line Width': ('width', 'Line Width'),
+        'Line Color': ('line_color', 'Line Color'),
+        'Opacity': ('opacity', 'Opacity'),
+        'Line Mode': ('mode', 'Mode'),
+        'Marker Symbol': ('marker_symbol', 'Marker Symbol'),
+        'Marker Size': ('marker_size', 'Marker Size'),
+        'Dash': ('dash', 'Dash'),
+        'Line Gaps': ('connectgaps', 'Connect Gaps'),
+    }
+
     def __init__(
             self,
+            df: pd.DataFrame,
             x_axis_column_name: str,
             y_axis_dict: dict,
             trace_name: str,
             trace_type: str = "Line",
     ) -> object:
-        super().__init__(trace_name, trace_type)
+        super().__init__(df, trace_name, trace_type)
         self.x_axis_column_name = x_axis_column_name
         self.y_axis_dict = y_axis_dict
         self.marker_symbol = "circle"
@@ -149,41 +243,60 @@ class Line(Trace):
         self.mode = "lines"
         self.dash = None
         self.connectgaps = True
+        self.downsample = "lttb"
+        # Positions of the rows drawn, None for all of them, so per point styles can follow.
+        self.points = None
 
     def add_trace(self):
         traces = super().get_traces()
         column = self.y_axis_dict["name"]
         # self.traces_dict[column] = True
         if column not in traces:
-            self.fig.add_trace(
-                go.Scatter(
-                    x=self.df[self.x_axis_column_name],
-                    y=self.df[column],
-                    mode=self.mode,
-                    connectgaps=self.connectgaps,
-                    opacity=self.opacity,
-                    line=dict(
-                        color=self.line_color,
-                        width=self.width,
-                        dash=self.dash,
-                    ),
-                    marker=dict(symbol=self.marker_symbol, size=self.marker_size),
-                    name=column,
-                ),
-                secondary_y=self.y_axis_dict["dual"],
-            )
+            x = self.df[self.x_axis_column_name]
+            y = self.df[column]
+            # Without downsampling every point is sent already, zoomed or not.
+            points = line_sampler.visible(self.data_key, x, self.x_range if self.downsample != "off" else None)
+            if points is not None:
+                x, y = x.iloc[points], y.iloc[points]
+            sampled = line_sampler.points(self.sample_key(column), x, y, self.downsample)
+            if sampled is not None:
+                x, y = x.iloc[sampled], y.iloc[sampled]
+                points = sampled if points is None else points[sampled]
+            self.points = points
+            t = scatter_class(len(x))(x=x, y=y, name=column)
+            t.update(self.style(t))
+            self.fig.add_trace(t, secondary_y=self.y_axis_dict["dual"])
+
+    def style(self, trace) -> dict:
+        return dict(
+            mode=self.mode,
+            connectgaps=self.connectgaps,
+            opacity=self.opacity,
+            line=dict(
+                color=self.line_color,
+                width=self.width,
+                dash=self.dash,
+            ),
+            marker=dict(symbol=at_points(self.marker_symbol, self.points), size=at_points(self.marker_size, self.points)),
+        )
+
+    def sample_key(self, column: str):
+        if self.data_key is None:
+            return None
+        return self.data_key, self.x_axis_column_name, column, LINE_POINT_TARGET, self.downsample, self.x_range
 
 class Bar(Trace):
     """Represents a Bar Graph trace."""
 
     def __init__(
         self,
+        df: pd.DataFrame,
         x_axis_column_name: str,
         y_axis_dict: dict,
         trace_name: str,
         trace_type: str = "Bar",
     ) -> object:
-        super().__init__(trace_name, trace_type)
+        super().__init__(df, trace_name, trace_type)
         self.x_axis_column_name = x_axis_column_name
         self.y_axis_dict = y_axis_dict
         self.text = None
@@ -225,9 +338,10 @@ class Bar(Trace):
                 # name=column,
             )
             if self.color_by_column is None:
-                bar_fig.data[0]["marker"]["color"] = self.color
                 bar_fig.data[0]["name"] = self.trace_name
-            bar_fig.update_traces(width=self.width)
+                bar_fig.data[0].update(self.style(bar_fig.data[0]))
+            else:
+                bar_fig.update_traces(width=self.width)
 
             if self.color_by_column is not None:
                 for t in bar_fig.data:
@@ -241,8 +355,240 @@ class Bar(Trace):
                     secondary_y=self.y_axis_dict["dual"],
                 )
 
+    def style(self, trace) -> dict:
+        return dict(marker=dict(color=self.color, opacity=self.opacity), width=self.width)
+
+    def restyle(self, g):
+        # Bars colored by a column are one trace per category, named after it.
+        if self.color_by_column is None:
+            super().restyle(g)
+        else:
+            g.delete_trace(self.trace_name, True)
+            update_cycle(g, self)
+
+
+LINE_POINT_TARGET = int(os.environ.get("VIZTOOL_LINE_POINT_TARGET", 2000))
+WEBGL_POINT_THRESHOLD = int(os.environ.get("VIZTOOL_WEBGL_POINT_THRESHOLD", 50000))
+
+
+def scatter_class(points: int):
+    """``go.Scattergl`` for traces with more than ``WEBGL_POINT_THRESHOLD`` points, which stall the
+    browser as SVG. Both take the same marker and line options."""
+    return go.Scattergl if points > WEBGL_POINT_THRESHOLD else go.Scatter
+
+
+DENSITY_BINS = int(os.environ.get("VIZTOOL_DENSITY_BINS", 200))
+
+
+def axis_position(value, dtype) -> float:
+    """An axis range value from relayoutData in the units of sample_axis for a column of ``dtype``.
+
+    plotly.js draws tz-aware dates at their local clock time and drops the UTC offset, so the
+    ranges it sends back are local times of the column's zone."""
+    if dtype.kind != "M":
+        return float(value)
+    stamp = pd.Timestamp(value)
+    tz = getattr(dtype, "tz", None)
+    if tz is not None:
+        stamp = stamp.tz_localize(tz, ambiguous=True, nonexistent="shift_forward") if stamp.tzinfo is None \
+            else stamp.tz_convert(tz)
+    return stamp.value
+
+
+def axis_bounds(values: np.ndarray, axis_range, dtype):
+    """``axis_range`` in the units of ``values`` (see sample_axis), or the extent of ``values``."""
+    if axis_range is not None:
+        try:
+            return sorted(axis_position(value, dtype) for value in axis_range)
+        except (TypeError, ValueError):
+            pass
+    return [np.nanmin(values), np.nanmax(values)]
+
+
+def bin_centers(bounds: list, bins: int, dtype):
+    centers = bounds[0] + (np.arange(bins) + 0.5) * (bounds[1] - bounds[0]) / bins
+    if dtype.kind != "M":
+        return centers
+    centers = pd.to_datetime(centers.astype(np.int64))
+    # In the column's zone, so cells line up with the points plotly.js draws at local time.
+    tz = getattr(dtype, "tz", None)
+    return centers.tz_localize("UTC").tz_convert(tz) if tz is not None else centers
+
+
+def density_grid(x: np.ndarray, y: np.ndarray, x_bounds: list, y_bounds: list, bins: int) -> np.ndarray:
+    """Counts of the points in each of ``bins`` x ``bins`` equal cells spanning the bounds.
+
+    Cell positions are computed directly and counted with ``np.bincount``, which is much faster than
+    ``np.histogram2d`` searching the bin edges of every point."""
+    x_width = (x_bounds[1] - x_bounds[0]) or 1.0
+    y_width = (y_bounds[1] - y_bounds[0]) or 1.0
+    with np.errstate(invalid="ignore"):
+        i = np.floor((x - x_bounds[0]) * (bins / x_width))
+        j = np.floor((y - y_bounds[0]) * (bins / y_width))
+        # Points on the upper bounds belong to the last cell.
+        i[x == x_bounds[1]] = bins - 1
+        j[y == y_bounds[1]] = bins - 1
+        inside = (i >= 0) & (i < bins) & (j >= 0) & (j < bins)
+    cells = i[inside].astype(np.int64) * bins + j[inside].astype(np.int64)
+    return np.bincount(cells, minlength=bins * bins).reshape(bins, bins)
+
+
+def sample_axis(series: pd.Series):
+    """``series`` as floats for downsampling, or None when it has no numeric meaning."""
+    if series.dtype.kind == "M":
+        # Nanoseconds since the epoch (UTC for tz-aware dates), NaT as NaN rather than int64 min.
+        values = series.array.asi8.astype(np.float64)
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    if series.dtype.kind in "iufb":
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return None
+
+
+def lttb(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """Positions of the ``target`` points Largest-Triangle-Three-Buckets keeps to draw ``y`` over ``x``."""
+    n = len(y)
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    points = np.empty(target, dtype=np.int64)
+    points[0], points[-1] = 0, n - 1
+    a = 0
+    for i in range(target - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_y = y[stop:next_stop]
+        next_y = np.nanmean(next_y) if not np.isnan(next_y).all() else np.nan
+        next_x = x[stop:next_stop]
+        next_x = np.nanmean(next_x) if not np.isnan(next_x).all() else np.nan
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a]))
+        # A bucket of gaps keeps its first point, so the gap is still drawn.
+        a = start if np.isnan(area).all() else start + int(np.nanargmax(area))
+        points[i + 1] = a
+    return points
+
+
+def minmax(y: np.ndarray, target: int) -> np.ndarray:
+    """Positions of the lowest and highest point of ``target // 2`` equal buckets of ``y``."""
+    edges = np.linspace(0, len(y), target // 2 + 1).astype(np.int64)
+    points = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        bucket = y[start:stop]
+        if np.isnan(bucket).all():
+            points.append(start)
+        else:
+            points.extend(sorted({start + int(np.nanargmin(bucket)), start + int(np.nanargmax(bucket))}))
+    return np.array(points, dtype=np.int64)
+
+
+class LineSampler:
+    """Which points of a line trace to draw, and the density grids of scatter traces, cached per
+    dataset rows, columns, target, method and zoom so that restyling a trace does not sample it
+    again. Dropped least recently used first once they exceed ``max_bytes``."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._cache = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def points(self, key, x: pd.Series, y: pd.Series, method: str, target: int = LINE_POINT_TARGET):
+        """Positions of the points to keep, or None to draw every point."""
+        if method not in ("lttb", "minmax") or len(y) <= target:
+            return None
+        points = self._get(("points", key))
+        if points is not None:
+            return points
+        y_values = sample_axis(y)
+        if y_values is None:
+            return None
+        if method == "minmax":
+            points = minmax(y_values, target)
+        else:
+            x_values = sample_axis(x)
+            if x_values is None:
+                x_values = np.arange(len(y), dtype=np.float64)
+            else:
+                # Points without an x position cannot be drawn, so are only kept like gaps.
+                y_values = np.where(np.isnan(x_values), np.nan, y_values)
+            points = lttb(x_values, y_values, target)
+        return self._put(("points", key), points)
+
+    def visible(self, key, x: pd.Series, x_range):
+        """Positions, in row order, of the points with ``x`` in ``x_range`` and their neighbours just
+        outside it, so the line runs to the edges of the view. None to keep every point."""
+        if x_range is None:
+            return None
+        order = self._get(("order", key, x.name))
+        if order is None:
+            values = sample_axis(x)
+            if values is None:
+                return None
+            order = np.argsort(values, kind="stable")
+            order = self._put(("order", key, x.name), (order, values[order]))
+        order, sorted_values = order
+        try:
+            bounds = [axis_position(value, x.dtype) for value in x_range]
+        except (TypeError, ValueError):
+            return None
+        start = max(np.searchsorted(sorted_values, min(bounds), side="left") - 1, 0)
+        stop = np.searchsorted(sorted_values, max(bounds), side="right") + 1
+        return np.sort(order[start:stop])
+
+    def density(self, key, x: pd.Series, y: pd.Series, x_range, y_range, bins: int = DENSITY_BINS):
+        """Point counts of ``bins`` x ``bins`` cells over the ranges, or the extent of the data when
+        not zoomed, with the x and y cell centers. None when an axis is not numeric or has no values."""
+        grid = self._get(("density", key))
+        if grid is not None:
+            return grid
+        x_values, y_values = sample_axis(x), sample_axis(y)
+        if x_values is None or y_values is None or np.isnan(x_values).all() or np.isnan(y_values).all():
+            return None
+        x_bounds = axis_bounds(x_values, x_range, x.dtype)
+        y_bounds = axis_bounds(y_values, y_range, y.dtype)
+        grid = (
+            density_grid(x_values, y_values, x_bounds, y_bounds, bins),
+            bin_centers(x_bounds, bins, x.dtype),
+            bin_centers(y_bounds, bins, y.dtype),
+        )
+        return self._put(("density", key), grid)
+
+    def _get(self, cache_key):
+        if cache_key[1] is None:
+            return None
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is None:
+                return None
+            self._cache.move_to_end(cache_key)
+            return entry[0]
+
+    def _put(self, cache_key, value):
+        if cache_key[1] is not None:
+            # Sorted x indexes and density grids are tuples of arrays.
+            nbytes = sum(part.nbytes for part in value) if isinstance(value, tuple) else value.nbytes
+            with self._lock:
+                if cache_key in self._cache:
+                    self._nbytes -= self._cache.pop(cache_key)[1]
+                self._cache[cache_key] = (value, nbytes)
+                self._nbytes += nbytes
+                while self._nbytes > self.max_bytes and len(self._cache) > 1:
+                    _, (_, dropped) = self._cache.popitem(last=False)
+                    self._nbytes -= dropped
+        return value
+
+
+LINE_CACHE_MAX_BYTES = int(os.environ.get("VIZTOOL_LINE_CACHE_MB", 256)) * 1024 ** 2
+line_sampler = LineSampler(LINE_CACHE_MAX_BYTES)
+
+
+def at_points(value, points):
+    """Per point styles (see operator_filter) follow the points kept by downsampling."""
+    if points is None or not isinstance(value, np.ndarray):
+        return value
+    return value[points]
+
 
 def default_graph(
+        fig,
         df,
         xaxis_column_name,
         y_axis_dict,
@@ -345,7 +691,7 @@ def line_dash_dropdown_options():
     return [dict(zip(("label", "value"), option)) for option in zip(options, options)]
 
 
-def df_column_dropdown_options():
+def df_column_dropdown_options(df):
     cols = list(df.columns)
     return [dict(zip(("label", "value"), col)) for col in zip(cols, cols)]
 
@@ -440,6 +786,26 @@ def conditional_change_to_options(option: str) -> object:
 
 
 
+def compare_column(series, operator, value):
+    """``getattr(series, operator)(value)`` that also orders categorical columns by their categories,
+    comparing against the (few) categories once instead of every row."""
+    if series.dtype.name == "category" and operator in ("lt", "le", "gt", "ge"):
+        hits = getattr(pd.Series(series.cat.categories), operator)(value).to_numpy()
+        # Missing values have code -1, which picks the trailing False.
+        return pd.Series(np.append(hits, False)[series.cat.codes.to_numpy()], index=series.index)
+    return getattr(series, operator)(value)
+
+
+def text_column(series):
+    # Date-like columns are parsed at upload, text filters still match their printed form.
+    if series.dtype.kind == "M":
+        return series.astype(str)
+    return series
+
+
+comparison_operators = {">": "gt", "<": "lt", ">=": "ge", "<=": "le", "==": "eq", "!=": "ne"}
+
+
 def operator_filter(df, operator, original_value, new_value, col, condition):
     if (
             condition != []
@@ -453,15 +819,8 @@ def operator_filter(df, operator, original_value, new_value, col, condition):
             new_value = float(new_value)
         print(new_value)
         print(type(new_value))
-        ops = {
-            ">": op.gt(df[col], condition),
-            "<": op.lt(df[col], condition),
-            ">=": op.ge(df[col], condition),
-            "<=": op.le(df[col], condition),
-            "==": op.eq(df[col], condition),
-            "!=": op.ne(df[col], condition),
-        }
-        return np.where(ops[operator], new_value, original_value)
+        mask = compare_column(df[col], comparison_operators[operator], condition)
+        return np.where(mask, new_value, original_value)
     else:
         return original_value
 
@@ -470,10 +829,8 @@ def operators_change(df, operator, original_value, new_value, col, condition):
     return operator_filter(df, operator, original_value, new_value, col, condition)
 
 
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-
 def default_graph(
+        fig,
         df,
         xaxis_column_name,
         y_axis_dict,
@@ -512,6 +869,7 @@ def default_graph(
 
 
 def line_chart(
+        fig,
         df,
         xaxis_column_name,
         yaxis_column_name,
@@ -536,6 +894,7 @@ def bar_chart(
 
 
 def area_chart(
+        fig,
         df,
         xaxis_column_name,
         yaxis_column_name,
@@ -549,6 +908,7 @@ def area_chart(
 
 
 def box_plot(
+        fig,
         df,
         xaxis_column_name,
         yaxis_column_name,
@@ -583,12 +943,364 @@ def default_layout(fig):
     )
 
 
-########################################################################################################################
+##########################################Storage#######################################################################
+
+DATA_DIR = pathlib.Path(os.environ.get("VIZTOOL_DATA_DIR", pathlib.Path(__file__).parent / ".viztool"))
+STORE_MAX_BYTES = int(os.environ.get("VIZTOOL_STORE_MAX_MB", 4096)) * 1024 ** 2
+
+
+def codes_dtype(n_categories: int):
+    # Same width pandas picks for Categorical codes, so attaching never has to cast them.
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ColumnStore:
+    """Parsed datasets kept as memory-mapped column files under ``root``.
+
+    Runs of numeric columns sharing a dtype are written as one 2D block with one contiguous row
+    per column, and every other column is dictionary encoded into integer codes plus a list of
+    categories. Attaching maps the files read-only, so all worker processes share the same pages
+    instead of each owning a private ``pd.DataFrame``.
+
+    Keys are normally content hashes of the upload (see ``content_key``), which makes the store a
+    cache: once it holds more than ``max_bytes``, the least recently attached datasets are
+    deleted. Workers that already mapped a deleted dataset keep reading it until they let go.
+    """
+
+    def __init__(self, root, max_bytes: int = None):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def __contains__(self, key) -> bool:
+        return (self.root / key / "meta.json").exists()
+
+    def nbytes(self, key: str) -> int:
+        return sum(f.stat().st_size for f in (self.root / key).iterdir())
+
+    def evict(self, keep: str = None):
+        if self.max_bytes is None:
+            return
+        entries = []
+        for path in self.root.iterdir():
+            try:
+                entries.append((path.joinpath("meta.json").stat().st_mtime, path.name, self.nbytes(path.name)))
+            except OSError:
+                # Still being written, or removed by another worker.
+                continue
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            print(f'evicting dataset {key}')
+            shutil.rmtree(self.root / key, ignore_errors=True)
+            total -= size
+
+    def publish(self, df: pd.DataFrame, key: str = None, info: dict = None) -> str:
+        key = key or uuid.uuid4().hex
+        if key in self:
+            return key
+        tmp = self.root / f".{key}.{uuid.uuid4().hex}"
+        tmp.mkdir(parents=True)
+        parts = []
+        for run in self._runs(df):
+            parts.append(self._write_part(tmp, len(parts), df, run))
+        meta = {"rows": len(df), "parts": parts, "info": info or {}}
+        (tmp / "meta.json").write_text(json.dumps(meta, default=str))
+        try:
+            os.rename(tmp, self.root / key)
+        except OSError:
+            # Another worker published the same key first.
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+        return key
+
+    def info(self, key: str) -> dict:
+        return json.loads((self.root / key / "meta.json").read_text())["info"]
+
+    def attach(self, key: str) -> pd.DataFrame:
+        path = self.root / key
+        # The meta file's mtime is the recency used for eviction.
+        os.utime(path / "meta.json")
+        meta = json.loads((path / "meta.json").read_text())
+        frames = []
+        for part in meta["parts"]:
+            values = np.load(path / part["file"], mmap_mode="r")
+            if part["kind"] == "block":
+                if part["dtype"] != str(values.dtype):
+                    values = values.view(part["dtype"])
+                if part.get("tz"):
+                    dtype = pd.DatetimeTZDtype(tz=part["tz"])
+                    frames.append(pd.DataFrame(
+                        {column: pd.arrays.DatetimeArray(row, dtype=dtype) for column, row in zip(part["columns"], values)},
+                        copy=False,
+                    ))
+                else:
+                    frames.append(pd.DataFrame(values.T, columns=part["columns"], copy=False))
+            else:
+                column = pd.Categorical.from_codes(values, categories=part["categories"])
+                frames.append(pd.DataFrame({part["columns"][0]: column}, copy=False))
+        if not frames:
+            return pd.DataFrame(index=pd.RangeIndex(meta["rows"]))
+        return pd.concat(frames, axis=1, copy=False)
+
+    @staticmethod
+    def _block_dtype(series: pd.Series):
+        # tz-aware dates are stored as UTC nanoseconds, with the time zone in the part meta.
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            return series.dtype
+        if not isinstance(series.dtype, np.dtype):
+            return None
+        if series.dtype.kind in "biuf":
+            return series.dtype
+        if series.dtype.kind in "mM":
+            return series.dtype
+        return None
+
+    def _runs(self, df: pd.DataFrame):
+        run, run_dtype = [], None
+        for i in range(df.shape[1]):
+            dtype = self._block_dtype(df.iloc[:, i])
+            if run and (dtype is None or dtype != run_dtype):
+                yield run
+                run = []
+            run.append(i)
+            run_dtype = dtype
+            if dtype is None:
+                yield run
+                run = []
+        if run:
+            yield run
+
+    def _write_part(self, path: pathlib.Path, n: int, df: pd.DataFrame, run: list) -> dict:
+        file = f"part_{n}.npy"
+        columns = [df.columns[i] for i in run]
+        first = df.iloc[:, run[0]]
+        dtype = self._block_dtype(first)
+        if dtype is not None:
+            storage_dtype = np.int64 if dtype.kind in "mM" else dtype
+            block = np.lib.format.open_memmap(path / file, mode="w+", dtype=storage_dtype, shape=(len(run), len(df)))
+            tz = getattr(dtype, "tz", None)
+            for row, i in enumerate(run):
+                column = df.iloc[:, i]
+                block[row] = column.array.asi8 if tz is not None else column.to_numpy().view(storage_dtype)
+            block.flush()
+            del block
+            if tz is not None:
+                return {"kind": "block", "file": file, "columns": columns, "dtype": "datetime64[ns]", "tz": str(tz)}
+            return {"kind": "block", "file": file, "columns": columns, "dtype": str(dtype)}
+
+        if first.dtype.name == "category":
+            codes, categories = first.cat.codes.to_numpy(), first.cat.categories
+        else:
+            try:
+                codes, categories = pd.factorize(first, sort=True)
+            except TypeError:
+                # Mixed types that cannot be ordered keep their order of appearance.
+                codes, categories = pd.factorize(first)
+        np.save(path / file, codes.astype(codes_dtype(len(categories))))
+        return {"kind": "dictionary", "file": file, "columns": columns, "categories": list(categories.tolist())}
 
-########################################################################################################################
 
+store = ColumnStore(DATA_DIR / "columns", STORE_MAX_BYTES)
+
+
+##########################################Sessions######################################################################
+
+# Every gunicorn worker keeps its own registry, so the budget applies per process.
+SESSION_MEMORY_BUDGET = int(os.environ.get("VIZTOOL_SESSION_MEMORY_MB", 1024)) * 1024 ** 2
+
+# Store keys ending in this hold only the first rows of an upload whose full parse is running.
+PREVIEW_SUFFIX = ".preview"
+# How often a worker looks for records of sessions whose dataset was evicted, see SessionRegistry.prune.
+SESSION_PRUNE_INTERVAL_S = 600
+SESSION_CHECK_INTERVAL_MS = 30000
+
+
+class Session:
+    """The uploaded datasets of one browser session, and the figures built from the active one."""
+
+    def __init__(self, session_id: str, datasets: dict = None, active: str = None, df: pd.DataFrame = None):
+        self.session_id = session_id
+        self.datasets = collections.OrderedDict(datasets or {})
+        self.active = active
+        self.dataset_key = self.datasets.get(active)
+        self.df = pd.DataFrame() if df is None else df
+        self.g = Graph(self.df, self.dataset_key)
+        self.fig = make_subplots(specs=[[{"secondary_y": True}]])
+        # Table filter clauses the graph is plotting, see link_graph.
+        self.graph_filter = ()
+
+    def memory_usage(self) -> int:
+        return int(self.df.memory_usage(index=True, deep=True).sum())
+
+
+class SessionRegistry:
+    """Sessions keyed by the id held in the ``session`` store, evicted least recently used first
+    once their datasets exceed ``memory_budget`` bytes.
+
+    Which datasets a session holds is recorded next to the column store, so a worker that has not
+    seen the session before attaches to the same columns instead of coming up empty.
+    """
+
+    def __init__(self, memory_budget: int, store: ColumnStore, root):
+        self.memory_budget = memory_budget
+        self.store = store
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._sessions = collections.OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self._pruned_at = 0.0
+
+    def _record(self, session_id: str):
+        try:
+            return self.root / str(uuid.UUID(session_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                return self._upgrade(session)
+        record = self._record(session_id)
+        if record is None or not record.exists():
+            return None
+        saved = json.loads(record.read_text())
+        datasets = collections.OrderedDict(saved["datasets"])
+        active = datasets.get(saved["active"])
+        if active is not None and active not in self.store and self._live(active):
+            # The preview was evicted after the full parse came in, _upgrade swaps the others.
+            datasets[saved["active"]] = active[:-len(PREVIEW_SUFFIX)]
+        if datasets.get(saved["active"]) not in self.store:
+            return None
+        session = Session(session_id, datasets, saved["active"], self.store.attach(datasets[saved["active"]]))
+        return self._upgrade(self._add(session))
+
+    def open(self, session_id: str, datasets: dict, active: str) -> Session:
+        """Makes ``active`` out of the named store keys in ``datasets`` the session's dataset."""
+        self._save(session_id, datasets, active)
+        if time.time() - self._pruned_at > SESSION_PRUNE_INTERVAL_S:
+            self._pruned_at = time.time()
+            self.prune()
+        return self._add(Session(session_id, datasets, active, self.store.attach(datasets[active])))
+
+    def _live(self, key: str) -> bool:
+        """Whether ``key`` is in the store, or is a preview whose full parse is."""
+        return key in self.store or (key.endswith(PREVIEW_SUFFIX) and key[:-len(PREVIEW_SUFFIX)] in self.store)
+
+    def expired(self, session_id: str) -> bool:
+        """Whether the active dataset of a recorded session was evicted from the store. The record is
+        deleted then, so each session is told once."""
+        record = self._record(session_id)
+        if record is None:
+            return False
+        try:
+            saved = json.loads(record.read_text())
+        except (FileNotFoundError, ValueError):
+            return False
+        key = dict(saved["datasets"]).get(saved["active"])
+        if key is not None and self._live(key):
+            return False
+        record.unlink(missing_ok=True)
+        return True
+
+    def prune(self):
+        """Deletes the records of sessions whose dataset was evicted from the store, which nothing
+        else removes once their browser tab is gone."""
+        for record in self.root.iterdir():
+            if not record.name.startswith("."):
+                self.expired(record.name)
+            elif time.time() - record.stat().st_mtime > SESSION_PRUNE_INTERVAL_S:
+                # Left behind by a worker that died while writing it.
+                record.unlink(missing_ok=True)
+
+    def _save(self, session_id: str, datasets: dict, active: str):
+        record = self._record(session_id)
+        if record is not None:
+            # Other workers read the record at any time, so swap in a complete file.
+            part = record.with_name(f".{record.name}.{uuid.uuid4().hex}")
+            part.write_text(json.dumps({"datasets": list(datasets.items()), "active": active}))
+            os.replace(part, record)
+
+    def _upgrade(self, session: Session) -> Session:
+        """Swaps datasets still showing a preview for the full parse once it is in the store,
+        redrawing the session's traces from it."""
+        finished = collections.OrderedDict(
+            (name, key[:-len(PREVIEW_SUFFIX)])
+            for name, key in session.datasets.items()
+            if key.endswith(PREVIEW_SUFFIX) and key[:-len(PREVIEW_SUFFIX)] in self.store
+        )
+        if not finished:
+            return session
+        with self._lock:
+            session.datasets.update(finished)
+            self._save(session.session_id, session.datasets, session.active)
+            if session.active in finished:
+                session.dataset_key = finished[session.active]
+                session.df = self.store.attach(session.dataset_key)
+                session.graph_filter = ()
+                try:
+                    rebind_graph(session.g, session.df, session.dataset_key)
+                except Exception as e:
+                    # Runs inside get_session, so a trace that cannot be redrawn must not fail
+                    # every callback. Start over with an empty graph of the full rows instead.
+                    print(f'could not redraw the traces of session {session.session_id}: {e}')
+                    session.g = Graph(session.df, session.dataset_key)
+                if session.session_id in self._sizes:
+                    self._sizes[session.session_id] = session.memory_usage()
+        return session
+
+    def _add(self, session: Session) -> Session:
+        size = session.memory_usage()
+        with self._lock:
+            self.discard(session.session_id)
+            self._sessions[session.session_id] = session
+            self._sizes[session.session_id] = size
+            self._evict(keep=session.session_id)
+        return session
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def _evict(self, keep: str):
+        while self.memory_usage() > self.memory_budget:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            print(f'evicting session {oldest}')
+            self.discard(oldest)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionRegistry(SESSION_MEMORY_BUDGET, store, DATA_DIR / "sessions")
+
+
+def get_session(session_id) -> Session:
+    """Returns the session for ``session_id`` or stops the callback if nothing was uploaded yet."""
+    session = sessions.get(session_id) if session_id else None
+    if session is None:
+        raise PreventUpdate
+    return session
+
+
+########################################################################################################################
 
-df = pd.DataFrame()
 SIDEBAR_STYLE = {
     "position": "fixed",
     "top": 0,
@@ -855,6 +1567,49 @@ scatter_formatting_options = html.Div(
             },
             id="graph-options-9",
         ),
+        html.Div(
+            children=[
+                html.Div(
+                    "Render:",
+                    style={
+                        "position": "relative",
+                        "margin-left": "67px",
+                        "top": "8px",
+                        "padding": "3px",
+                        "border": "none",
+                        "color": "white",
+                        "display": "inline",
+                        "size": "10",
+                    },
+                ),
+                html.Div(
+                    dcc.Dropdown(
+                        id="scatter_render_dropdown",
+                        options=[
+                            {'label': 'Points', 'value': 'points'},
+                            {'label': 'Density', 'value': 'density'},
+                        ],
+                        value='points',
+                        style={
+                            "width": "100px",
+                            "height": "8px",
+                            "vertical-align": "middle",
+                            "font-size": 10,
+                        },
+                    ),
+                    style={
+                        "position": "absolute",
+                        "margin-left": "5px",
+                        "margin-top": "3px",
+                        "background": "",
+                        "display": "inline",
+                    },
+                ),
+            ],
+            style={
+                "padding-top": "20px",
+            },
+        ),
     ],
     id='scatter_formatting_options',
     style={}
@@ -1175,6 +1930,50 @@ line_formatting_options = html.Div(
                 "padding-top": "20px",
             },
         ),
+        html.Div(
+            children=[
+                html.Div(
+                    "Downsample:",
+                    style={
+                        "position": "relative",
+                        "margin-left": "67px",
+                        "top": "8px",
+                        "padding": "3px",
+                        "border": "none",
+                        "color": "white",
+                        "display": "inline",
+                        "size": "10",
+                    },
+                ),
+                html.Div(
+                    dcc.Dropdown(
+                        id="line_downsample_dropdown",
+                        options=[
+                            {'label': 'LTTB', 'value': 'lttb'},
+                            {'label': 'Min/Max', 'value': 'minmax'},
+                            {'label': 'Off', 'value': 'off'},
+                        ],
+                        value='lttb',
+                        style={
+                            "width": "100px",
+                            "height": "8px",
+                            "vertical-align": "middle",
+                            "font-size": 10,
+                        },
+                    ),
+                    style={
+                        "position": "absolute",
+                        "margin-left": "5px",
+                        "margin-top": "3px",
+                        "background": "",
+                        "display": "inline",
+                    },
+                ),
+            ],
+            style={
+                "padding-top": "20px",
+            },
+        ),
         # html.Div(
         #     children=[
         #         html.Div(
@@ -2404,7 +3203,7 @@ def serve_layout():
     layout = html.Div(
         [
             dcc.Store(id="side_click"),
-            dcc.Store(id="session", storage_type="session"),
+            dcc.Store(id="session", storage_type="session", data=str(uuid.uuid4())),
             dcc.Location(id="url"),
             navbar,
             sidebar_,
@@ -2415,7 +3214,7 @@ def serve_layout():
     return layout
 
 
-app.layout = serve_layout()
+app.layout = serve_layout
 
 load_div = html.Div(
     children=[
@@ -2440,6 +3239,25 @@ load_div = html.Div(
             # Allow multiple files to be uploaded
             multiple=True,
         ),
+        html.Div(id="upload-status", style={"color": "red"}),
+        dcc.Store(id="excel-workbooks", data={}),
+        html.Div(
+            [
+                dcc.Dropdown(id="excel-workbook", options=[], placeholder="Select Workbook", clearable=False),
+                dcc.Dropdown(id="excel-sheet", options=[], placeholder="Select Sheet", clearable=False),
+                dcc.Dropdown(id="excel-columns", options=[], placeholder="All Columns", multi=True, value=[]),
+                dbc.Button("Load Sheet", id="excel-load", n_clicks=0, size="sm", color="secondary"),
+            ],
+            id="excel-picker",
+            style={"display": "none", "width": "800px"},
+        ),
+        dcc.Dropdown(
+            id="dataset-dropdown",
+            options=[],
+            placeholder="Select Dataset",
+            clearable=False,
+            style={"display": "none"},
+        ),
         html.Div(
             id="output-data-upload",
             style={
@@ -2511,25 +3329,635 @@ def render_page_content(pathname):
 
 ############################################################################
 
-def parse_contents(contents, filename, date):
-    content_type, content_string = contents.split(",")
+CSV_CHUNK_ROWS = int(os.environ.get("VIZTOOL_CSV_CHUNK_ROWS", 100000))
+UPLOAD_BUFFER_SIZE = 1024 ** 2
+
+
+class Base64Reader(io.RawIOBase):
+    """Binary stream over the base64 payload of a ``dcc.Upload`` data URL.
+
+    The payload is decoded one buffer at a time, so the raw file never exists in memory as a
+    single ``bytes`` or ``str`` object.
+    """
+
+    def __init__(self, contents: str, start: int = None):
+        self._contents = contents
+        self._start = self._pos = contents.index(",") + 1 if start is None else start
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def progress(self) -> float:
+        """Fraction of the payload decoded so far."""
+        return (self._pos - self._start) / max(len(self._contents) - self._start, 1)
+
+    def seekable(self):
+        # Zip archives are read from their central directory at the end of the file.
+        return True
+
+    def size(self) -> int:
+        return (len(self._contents) - self._start) // 4 * 3 - self._contents[-2:].count("=")
+
+    def tell(self) -> int:
+        return min((self._pos - self._start) // 4 * 3, self.size()) - len(self._pending)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence == io.SEEK_END:
+            offset += self.size()
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        offset = min(offset, self.size())
+        group, skip = divmod(offset, 3)
+        self._pos = self._start + group * 4
+        self._pending = b""
+        if skip:
+            self._pending = base64.b64decode(self._contents[self._pos:self._pos + 4])[skip:]
+            self._pos += 4
+        return offset
+
+    def readinto(self, buffer):
+        while len(self._pending) < len(buffer) and self._pos < len(self._contents):
+            # Whole 4 character groups always decode on their own.
+            size = (len(buffer) // 3 + 1) * 4
+            chunk = self._contents[self._pos:self._pos + size]
+            self._pos += len(chunk)
+            self._pending += base64.b64decode(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def upload_stream(contents: str) -> io.BufferedReader:
+    return io.BufferedReader(Base64Reader(contents), buffer_size=UPLOAD_BUFFER_SIZE)
+
+
+# Compressed uploads are decompressed as they are read, see ``decompress``.
+DECOMPRESSORS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def zip_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """The first CSV or Excel file in ``archive``."""
+    for info in archive.infolist():
+        if not info.is_dir() and re.search(r"csv|xls", info.filename.lower()):
+            return info
+    raise ValueError("no CSV or Excel file in the archive")
+
+
+def member_name(contents: str, filename: str) -> str:
+    """Name of the file held by an upload, without any compression suffix."""
+    suffix = pathlib.Path(filename).suffix.lower()
+    if suffix == ".zip":
+        return zip_member(zipfile.ZipFile(upload_stream(contents))).filename
+    if suffix in DECOMPRESSORS:
+        return filename[:-len(suffix)]
+    return filename
+
+
+def decompress(stream, filename: str):
+    """Wraps the upload ``stream`` so that reading it yields the bytes of the file it holds. Only
+    the decompressor's window is ever held in memory, never the inflated file."""
+    suffix = pathlib.Path(filename).suffix.lower()
+    if suffix == ".zip":
+        archive = zipfile.ZipFile(stream)
+        return archive.open(zip_member(archive))
+    if suffix in DECOMPRESSORS:
+        return DECOMPRESSORS[suffix](stream)
+    return stream
+
+
+def content_key(contents: str, kind: str) -> str:
+    """Store key for an upload: a hash of its payload and of how it is parsed."""
+    digest = hashlib.sha256(kind.encode())
+    start = contents.index(",") + 1
+    for pos in range(start, len(contents), UPLOAD_BUFFER_SIZE):
+        digest.update(contents[pos:pos + UPLOAD_BUFFER_SIZE].encode("ascii"))
+    return digest.hexdigest()
+
+
+def read_csv_chunks(stream, chunksize: int = CSV_CHUNK_ROWS, progress=None) -> pd.DataFrame:
+    """Parses ``stream`` ``chunksize`` rows at a time; only the parsed chunks are held until the
+    final concat, never the decoded text. ``progress`` is called after every chunk."""
+    chunks = []
+    for chunk in pd.read_csv(stream, chunksize=chunksize):
+        chunks.append(chunk)
+        if progress is not None:
+            progress()
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True, copy=False)
+
+
+CATEGORY_MAX_RATIO = 0.5
+DATE_SAMPLE_SIZE = 100
+
+
+def looks_like_dates(series: pd.Series) -> bool:
+    sample = series.dropna().head(DATE_SAMPLE_SIZE)
+    if len(sample) == 0 or not all(isinstance(value, str) for value in sample):
+        return False
+    # Plain numbers and times of day would parse as dates too (stamped with today's date), so ask
+    # for a date part.
+    if not sample.str.contains(r"\d[-/]\d|\d\s+[A-Za-z]{3}|[A-Za-z]{3}\s+\d").all():
+        return False
+    try:
+        pd.to_datetime(sample)
+    except (ValueError, TypeError, OverflowError):
+        return False
+    return True
+
+
+def optimize_column(series: pd.Series) -> pd.Series:
+    kind = series.dtype.kind
+    if kind == "i" or kind == "u":
+        return pd.to_numeric(series, downcast="integer" if kind == "i" else "unsigned")
+    if kind == "f":
+        narrow = series.astype(np.float32)
+        wide, original = narrow.to_numpy().astype(np.float64), series.to_numpy()
+        if ((wide == original) | (np.isnan(wide) & np.isnan(original))).all():
+            return narrow
+        return series
+    if kind != "O":
+        return series
+    if looks_like_dates(series):
+        dates = pd.to_datetime(series, errors="coerce", infer_datetime_format=True)
+        # Mixed UTC offsets come back as objects.
+        if dates.dtype.kind == "M" and dates.isna().sum() == series.isna().sum():
+            return dates
+    if series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+        try:
+            return series.astype("category")
+        except TypeError:
+            return series
+    return series
+
+
+def optimize_dtypes(df: pd.DataFrame):
+    """Categorizes low-cardinality strings, parses date-like strings and downcasts numbers where
+    no value changes. Returns the new frame and its memory footprint before and after."""
+    before = int(df.memory_usage(index=True, deep=True).sum())
+    if df.shape[1]:
+        df = pd.concat([optimize_column(df.iloc[:, i]) for i in range(df.shape[1])], axis=1)
+    after = int(df.memory_usage(index=True, deep=True).sum())
+    return df, {"before": before, "after": after}
+
+
+PROFILE_TOP_VALUES = 5
+PROFILE_HISTOGRAM_BINS = 20
+
+
+def json_number(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def profile_column(series: pd.Series) -> dict:
+    missing = series.isna().to_numpy()
+    profile = {
+        "column": str(series.name),
+        "type": str(series.dtype),
+        "count": int(len(series) - missing.sum()),
+        "nulls": int(missing.sum()),
+        "distinct": int(series.nunique()),
+    }
+    kind = series.dtype.kind
+    if kind in "iufM" and profile["count"]:
+        tz = getattr(series.dtype, "tz", None)
+        if tz is not None:
+            series = series.dt.tz_convert(None)
+        values = series.to_numpy()[~missing]
+        numbers = values.view(np.int64) if kind == "M" else values.astype(np.float64)
+        # inf and -inf have no quantiles or bins worth showing.
+        numbers = numbers[np.isfinite(numbers)]
+        if len(numbers):
+            low, p25, median, p75, high = np.quantile(numbers, [0, 0.25, 0.5, 0.75, 1])
+            profile["histogram"] = np.histogram(numbers, bins=PROFILE_HISTOGRAM_BINS)[0].tolist()
+            stats = {"min": low, "p25": p25, "median": median, "p75": p75, "max": high, "mean": numbers.mean()}
+            if kind == "M":
+                stamps = {name: pd.Timestamp(int(value)) for name, value in stats.items()}
+                if tz is not None:
+                    stamps = {name: stamp.tz_localize("UTC").tz_convert(tz) for name, stamp in stamps.items()}
+                profile.update({name: str(stamp.round("s")) for name, stamp in stamps.items()})
+            else:
+                profile.update({name: json_number(value) for name, value in stats.items()})
+    else:
+        top = series.value_counts().head(PROFILE_TOP_VALUES)
+        profile["top"] = [[str(value), int(count)] for value, count in top.items()]
+    return profile
+
+
+def profile_columns(df: pd.DataFrame) -> list:
+    """Counts, range, quantiles and a histogram of every numeric or date column, the most common
+    values of the others. Computed once at ingest and kept with the dataset."""
+    profiles = []
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        try:
+            profiles.append(profile_column(series))
+        except (ValueError, OverflowError, FloatingPointError) as e:
+            # A profile is a nicety, the dataset loads without one for values numpy cannot bin.
+            print(f"Could not profile column {series.name}: {e}")
+            profiles.append({"column": str(series.name), "type": str(series.dtype)})
+    return profiles
+
+
+def format_bytes(n: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1024
+
+
+def ingest(df: pd.DataFrame, key: str):
+    df, report = optimize_dtypes(df)
+    store.publish(df, key, info={"memory": report, "profile": profile_columns(df)})
+
+
+def dataset_profile(session) -> list:
+    if session is None or session.dataset_key is None:
+        return []
+    profile = store.info(session.dataset_key).get("profile")
+    # Datasets stored before profiles were kept with them.
+    return profile if profile is not None else profile_columns(session.df)
+
+
+def sparkline(counts: list) -> str:
+    bars = "▁▂▃▄▅▆▇█"
+    top = max(counts, default=0)
+    return "".join(bars[min(int(len(bars) * count / top), len(bars) - 1)] if top else bars[0] for count in counts)
+
 
-    decoded = base64.b64decode(content_string)
-    global df
-    global g
+def profile_records(profile: list) -> list:
+    records = []
+    for column in profile:
+        record = {name: column.get(name) for name in
+                  ["column", "type", "count", "nulls", "distinct", "min", "p25", "median", "p75", "max", "mean"]}
+        for name, value in record.items():
+            if isinstance(value, float):
+                record[name] = f"{value:.6g}"
+        record["top"] = ", ".join(f"{value} ({count:,})" for value, count in column.get("top", []))
+        record["histogram"] = sparkline(column.get("histogram", []))
+        records.append(record)
+    return records
+
+
+def memory_summary(session) -> str:
+    if session is None or session.dataset_key is None:
+        return ""
+    report = store.info(session.dataset_key).get("memory")
+    if not report:
+        return ""
+    return f"Memory: {format_bytes(report['before'])} → {format_bytes(report['after'])}"
+
+
+UPLOAD_WORKERS = int(os.environ.get("VIZTOOL_UPLOAD_WORKERS", os.cpu_count() or 1))
+_upload_pool = None
+_upload_pool_lock = threading.Lock()
+
+
+def upload_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None:
+            _upload_pool = concurrent.futures.ProcessPoolExecutor(UPLOAD_WORKERS)
+        return _upload_pool
+
+
+def reset_upload_pool():
+    global _upload_pool
+    with _upload_pool_lock:
+        _upload_pool = None
+
+
+def submit_upload(fn, *args) -> concurrent.futures.Future:
+    try:
+        return upload_pool().submit(fn, *args)
+    except concurrent.futures.process.BrokenProcessPool:
+        reset_upload_pool()
+        return upload_pool().submit(fn, *args)
+
+
+def upload_kind(filename: str) -> str:
+    if "csv" in filename:
+        return "csv"
+    elif "xls" in filename:
+        return "xls"
+    raise ValueError(f"unsupported file type: {filename}")
+
+
+EXCEL_CHUNK_ROWS = int(os.environ.get("VIZTOOL_EXCEL_CHUNK_ROWS", 50000))
+STAGED_UPLOADS_MAX_BYTES = int(os.environ.get("VIZTOOL_STAGED_UPLOADS_MAX_MB", 1024)) * 1024 ** 2
+STAGED_UPLOADS_DIR = DATA_DIR / "uploads"
+
+
+def prune_staged_uploads(keep: pathlib.Path):
+    # Hidden files are still being written by some worker.
+    files = [f for f in STAGED_UPLOADS_DIR.iterdir() if not f.name.startswith(".")]
+    files.sort(key=lambda f: f.stat().st_mtime)
+    total = sum(f.stat().st_size for f in files)
+    for f in files:
+        if total <= STAGED_UPLOADS_MAX_BYTES:
+            break
+        if f != keep:
+            total -= f.stat().st_size
+            f.unlink()
+
+
+def staged_path(workbook: dict) -> pathlib.Path:
+    # The description round-trips through the browser, so only trust a hex key and known suffix.
+    if not re.fullmatch(r"[0-9a-f]{64}", workbook["key"]) or workbook["suffix"] not in (".xls", ".xlsx", ".xlsm"):
+        raise ValueError("invalid workbook")
+    return STAGED_UPLOADS_DIR / f"{workbook['key']}{workbook['suffix']}"
+
+
+def excel_headers(header) -> list:
+    """Column names of a header row, with blanks named and duplicates numbered like ``pd.read_excel``
+    does (``Total``, ``Total.1``)."""
+    names, counts = [], collections.Counter()
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        counts[name] = count + 1
+        names.append(name)
+    return names
+
+
+def stage_workbook(contents, filename) -> dict:
+    """Writes an uploaded workbook to disk and reads only its sheet names and header rows.
+
+    The returned description is kept by the browser until the user picks a sheet and columns,
+    which are then read by ``read_workbook_sheet``.
+    """
+    suffix = pathlib.Path(member_name(contents, filename)).suffix.lower()
+    workbook = {"filename": filename, "key": content_key(contents, "xls"), "suffix": suffix}
+    path = staged_path(workbook)
+    STAGED_UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        part = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        with open(part, "wb") as f:
+            shutil.copyfileobj(decompress(upload_stream(contents), filename), f, UPLOAD_BUFFER_SIZE)
+        os.replace(part, path)
+    os.utime(path)
+    prune_staged_uploads(keep=path)
+
+    sheets = collections.OrderedDict()
+    if workbook["suffix"] == ".xls":
+        import xlrd
+
+        book = xlrd.open_workbook(str(path), on_demand=True)
+        for name in book.sheet_names():
+            sheet = book.sheet_by_name(name)
+            sheets[name] = excel_headers(sheet.row_values(0) if sheet.nrows else [])
+            book.unload_sheet(name)
+        book.release_resources()
+    else:
+        import openpyxl
+
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        for sheet in book.worksheets:
+            sheets[sheet.title] = excel_headers(next(sheet.iter_rows(max_row=1, values_only=True), ()))
+        book.close()
+    workbook["sheets"] = sheets
+    return workbook
+
+
+def read_workbook_sheet(workbook: dict, sheet: str, columns: list = None) -> str:
+    """Reads one sheet of a staged workbook, restricted to the ``columns`` positions (all when
+    empty), into the column store and returns its key."""
+    headers = workbook["sheets"][sheet]
+    columns = sorted(columns) if columns else list(range(len(headers)))
+    key = hashlib.sha256(json.dumps([workbook["key"], sheet, columns]).encode()).hexdigest()
+    if key in store:
+        return key
+    names = [headers[i] for i in columns]
+    path = staged_path(workbook)
+    if workbook["suffix"] == ".xls":
+        df = pd.read_excel(path, sheet_name=sheet, usecols=columns)
+        df.columns = names
+    else:
+        import openpyxl
+
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        rows = book[sheet].iter_rows(min_row=2, values_only=True)
+        chunks = []
+        while True:
+            chunk = [
+                tuple(row[i] if i < len(row) else None for i in columns)
+                for row in itertools.islice(rows, EXCEL_CHUNK_ROWS)
+            ]
+            if not chunk:
+                break
+            chunks.append(pd.DataFrame.from_records(chunk, columns=names))
+        book.close()
+        df = pd.concat(chunks, ignore_index=True, copy=False) if chunks else pd.DataFrame(columns=names)
+        df = df.dropna(how="all").reset_index(drop=True)
+    ingest(df, key)
+    return key
+
+
+PREVIEW_ROWS = int(os.environ.get("VIZTOOL_PREVIEW_ROWS", 1000))
+LOAD_POLL_INTERVAL_MS = 500
+JOBS_DIR = DATA_DIR / "jobs"
+# Errors and the jobs of workers that died are kept this long for the sessions polling them.
+JOB_RETENTION_S = 24 * 3600
+
+
+def write_job(key: str, status: str, progress: float = 0.0, error: str = None):
+    """Records how far the full parse of ``key`` got, for whichever worker polls it next."""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    part = JOBS_DIR / f".{key}.{uuid.uuid4().hex}"
+    part.write_text(json.dumps({"status": status, "progress": progress, "error": error}))
+    os.replace(part, JOBS_DIR / key)
+
+
+def prune_jobs():
+    """Deletes job files older than ``JOB_RETENTION_S``. Finished jobs are deleted as they finish."""
+    if not JOBS_DIR.exists():
+        return
+    for job in JOBS_DIR.iterdir():
+        try:
+            if time.time() - job.stat().st_mtime > JOB_RETENTION_S:
+                job.unlink()
+        except FileNotFoundError:
+            # Replaced or pruned by another worker.
+            continue
+
+
+def read_job(key: str):
     try:
-        if "csv" in filename:
-            # Assume that the user uploaded a CSV file
-            df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
-            g = Graph(df)
-        elif "xls" in filename:
-            # Assume that the user uploaded an excel file
-            df = pd.read_excel(io.BytesIO(decoded))
-            g = Graph(df)
+        return json.loads((JOBS_DIR / key).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def parse_contents(contents, filename) -> str:
+    """Parses an upload into the column store and returns its key. Runs in the upload pool, so
+    only the key travels back to the callback, never the frame."""
+    kind = upload_kind(member_name(contents, filename))
+    key = content_key(contents, kind)
+    if key in store:
+        write_job(key, "done", 1.0)
+        return key
+    if kind == "csv":
+        # Assume that the user uploaded a CSV file
+        stream = upload_stream(contents)
+        try:
+            # Parsing is most of the work, the rest is optimize_dtypes and the store write.
+            df = read_csv_chunks(
+                decompress(stream, filename),
+                progress=lambda: write_job(key, "running", 0.9 * stream.raw.progress()),
+            )
+            ingest(df, key)
+        except Exception as e:
+            write_job(key, "error", error=str(e))
+            raise
+        write_job(key, "done", 1.0)
+    return key
+
+
+def preview_contents(contents, filename, key: str) -> str:
+    """Parses the header and first ``PREVIEW_ROWS`` rows of a CSV upload and returns their store
+    key, so the dataset can be shown while ``load_in_background`` parses the rest. Returns ``key``
+    itself when the preview already holds the whole file."""
+    df = pd.read_csv(decompress(upload_stream(contents), filename), nrows=PREVIEW_ROWS + 1)
+    if len(df) <= PREVIEW_ROWS:
+        ingest(df, key)
+        return key
+    preview_key = key + PREVIEW_SUFFIX
+    if preview_key not in store:
+        ingest(df.iloc[:PREVIEW_ROWS], preview_key)
+    return preview_key
+
+
+_loading = {}
+_loading_lock = threading.Lock()
+
+
+def load_in_background(contents, filename, key: str):
+    """Parses a whole upload in the upload pool without waiting for it. Progress and errors are
+    left in the job file for ``key``; sessions pick the dataset up once it is in the store."""
+    with _loading_lock:
+        if key in _loading:
+            return
+        prune_jobs()
+        write_job(key, "running")
+        future = submit_upload(parse_contents, contents, filename)
+        _loading[key] = future
+    future.add_done_callback(lambda f: finish_background_load(key, f))
+
+
+def finish_background_load(key: str, future: concurrent.futures.Future):
+    with _loading_lock:
+        _loading.pop(key, None)
+    try:
+        future.result()
     except Exception as e:
+        if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+            reset_upload_pool()
         print(e)
-        return html.Div(["There was an error processing this file."])
-
+        write_job(key, "error", error=str(e))
+    else:
+        # Sessions pick the dataset up from the store, nothing polls the job any more.
+        (JOBS_DIR / key).unlink(missing_ok=True)
+
+
+def parse_uploads(list_of_contents, list_of_names) -> list:
+    """Returns ``(file name, store key)`` pairs in upload order, with the exception that stopped a
+    file, or the staged workbook, in place of its key.
+
+    CSV files not in the store yet come back as the key of their first rows, while the rest of
+    each file is parsed concurrently in the background.
+    """
+    results = []
+    for contents, name in zip(list_of_contents, list_of_names):
+        try:
+            kind = upload_kind(member_name(contents, name))
+            if kind == "xls":
+                # Workbooks wait for the user to pick a sheet, see stage_workbook.
+                results.append((name, stage_workbook(contents, name)))
+                continue
+            key = content_key(contents, kind)
+            if key in store:
+                results.append((name, key))
+                continue
+            preview_key = preview_contents(contents, name, key)
+        except Exception as e:
+            results.append((name, e))
+            continue
+        if preview_key != key:
+            load_in_background(contents, name, key)
+        results.append((name, preview_key))
+    return results
+
+
+def read_single_sheets(results: list) -> list:
+    """``results`` of ``parse_uploads`` with the workbooks that have only one sheet, so nothing to
+    choose from, read concurrently in the upload pool. A workbook that fails is replaced by its
+    exception, like any other upload."""
+    futures = {}
+    for i, (name, result) in enumerate(results):
+        if isinstance(result, dict) and len(result["sheets"]) <= 1:
+            futures[i] = submit_upload(read_workbook_sheet, result, next(iter(result["sheets"]), None))
+    results = list(results)
+    for i, future in futures.items():
+        try:
+            results[i] = (results[i][0], future.result())
+        except Exception as e:
+            if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                reset_upload_pool()
+            results[i] = (results[i][0], e)
+    return results
+
+
+def dataset_name(name: str, taken) -> str:
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{name} ({n})"
+    return candidate
+
+
+TABLE_PAGE_SIZE = 10
+# Rows per request when the table is scrolled instead of paged, see toggle_table_scroll_mode.
+TABLE_WINDOW_ROWS = int(os.environ.get("VIZTOOL_TABLE_WINDOW_ROWS", 500))
+# Longer cell values are cut short in tooltips, 0 shows them in full.
+TOOLTIP_MAX_CHARS = int(os.environ.get("VIZTOOL_TOOLTIP_MAX_CHARS", 500))
+
+
+def page_count(rows: int, page_size: int) -> int:
+    return max(math.ceil(rows / page_size), 1)
+
+
+def row_count(rows: int, total: int) -> str:
+    if rows == total:
+        return f"{total:,} rows"
+    return f"{rows:,} of {total:,} rows"
+
+
+def table_tooltips(records: list, max_chars: int = TOOLTIP_MAX_CHARS) -> list:
+    """Markdown tooltips for the rows of one table page."""
+    tooltips = []
+    for row in records:
+        tooltip = {}
+        for column, value in row.items():
+            value = str(value)
+            if max_chars and len(value) > max_chars:
+                value = value[:max_chars] + "…"
+            tooltip[column] = {"value": value, "type": "markdown"}
+        tooltips.append(tooltip)
+    return tooltips
+
+
+def serve_dataset_layout(session: Session):
+    df = session.df
+    loading = session.dataset_key.endswith(PREVIEW_SUFFIX)
     return html.Div(
         [  # Chart Top Bar
             html.Div(
@@ -2590,6 +4018,42 @@ def parse_contents(contents, filename, date):
                     ),
                 ],
             ),
+            html.Div(
+                memory_summary(session),
+                id="dataset-memory",
+                style={"font-size": "12px", "color": "grey"},
+            ),
+            dbc.Button("Column Profile", id="profile-toggle", n_clicks=0, size="sm", color="secondary"),
+            dbc.Collapse(
+                dash_table.DataTable(
+                    id="profile-table",
+                    columns=[{"name": name.title(), "id": name} for name in
+                             ["column", "type", "count", "nulls", "distinct", "min", "p25", "median", "p75",
+                              "max", "mean", "top", "histogram"]],
+                    data=profile_records(dataset_profile(session)),
+                    style_table={"overflowX": "auto"},
+                    style_cell={"font-size": "12px", "maxWidth": "240px", "overflow": "hidden",
+                                "textOverflow": "ellipsis"},
+                ),
+                id="profile-collapse",
+                is_open=False,
+            ),
+            html.Div(
+                [
+                    html.Div(
+                        f"Showing the first {PREVIEW_ROWS} rows while the rest of the file loads.",
+                        id="load-progress-status",
+                        style={"font-size": "12px", "color": "grey"},
+                    ),
+                    dbc.Progress(id="load-progress", value=0, striped=True, animated=True),
+                ],
+                id="load-progress-container",
+                style={"display": "block" if loading else "none", "width": "800px"},
+            ),
+            dcc.Interval(id="load-progress-interval", interval=LOAD_POLL_INTERVAL_MS, disabled=not loading),
+            html.Div(id="dataset-expired", style={"color": "red"}),
+            dcc.Interval(id="dataset-expiry-interval", interval=SESSION_CHECK_INTERVAL_MS),
+            dcc.Store(id="dataset-version", data=session.dataset_key),
             dcc.Dropdown(
                 id="xaxis-column",
                 options=[{"value": x, "label": x} for x in df],
@@ -2620,6 +4084,18 @@ def parse_contents(contents, filename, date):
                 style={"display": "none"},
             ),
             dcc.Graph(id="indicator-graphic"),
+            dcc.Checklist(
+                id="link-table-filter",
+                options=[{"label": " Plot only the rows matching the table filter", "value": "link"}],
+                value=[],
+                style={"font-size": "12px"},
+            ),
+            dcc.Checklist(
+                id="table-scroll-mode",
+                options=[{"label": " Scroll through rows", "value": "scroll"}],
+                value=[],
+                style={"font-size": "12px"},
+            ),
             dash_table.DataTable(
                 id="table-sorting-filtering",
                 style_data={
@@ -2629,9 +4105,11 @@ def parse_contents(contents, filename, date):
                     "height": "auto",  # ,
                 },
                 style_table={"overflowX": "auto", "overflowY": "auto"},
-                data=df.to_dict("records"),
+                # Only the first page, the rest is served by update_table.
+                data=df.iloc[:TABLE_PAGE_SIZE].to_dict("records"),
                 columns=[{"name": i, "id": i} for i in df.columns],
-                page_size=10,
+                page_size=TABLE_PAGE_SIZE,
+                page_count=page_count(len(df), TABLE_PAGE_SIZE),
                 tooltip_duration=None,
                 page_current=0,
                 page_action="custom",
@@ -2641,6 +4119,26 @@ def parse_contents(contents, filename, date):
                 sort_mode="multi",
                 sort_by=[],
             ),
+            html.Div(
+                row_count(len(df), len(df)),
+                id="table-row-count",
+                style={"font-size": "12px", "color": "grey"},
+            ),
+            html.Div(id="table-query-plan", style={"font-size": "12px", "color": "grey"}),
+            dcc.Store(id="table-query-plan-data"),
+            html.Div(
+                [
+                    html.A("Export CSV", id="export-csv", href="", target="_blank"),
+                    html.A(
+                        "Export Arrow",
+                        id="export-arrow",
+                        href="",
+                        target="_blank",
+                        style={"margin-left": "1rem", "display": "inline" if ARROW_EXPORT else "none"},
+                    ),
+                ],
+                style={"font-size": "12px"},
+            ),
             html.Hr(),  # horizontal line
         ]
     )
@@ -2749,13 +4247,13 @@ def trace_component(trace_name, component_to_update, updated_value):
     return update
 
 
-def update_trace(trace_name, component_to_update, updated_value):
+def update_trace(fig, trace_name, component_to_update, updated_value):
     fig.for_each_trace(
         trace_component(trace_name, component_to_update, updated_value)
     )
 
 
-def clear_trace(trace_name):
+def clear_trace(fig, trace_name):
     # for i, d in enumerate(fig.data):
     #     if d['name'] == trace_name:
     #         print(d, i)
@@ -2769,12 +4267,12 @@ def clear_trace(trace_name):
     fig.data = new_data
 
 
-def keep_active_traces(active_y_columns):
+def keep_active_traces(fig, active_y_columns):
     traces = [trace['name'] for trace in fig.data]
     no_longer_active = [trace for trace in traces if trace not in active_y_columns]
     # print(f'no longer active {no_longer_active}')
     for trace in no_longer_active:
-        clear_trace(trace)
+        clear_trace(fig, trace)
 
 
 component_dict = {
@@ -2785,7 +4283,7 @@ component_dict = {
 }
 
 
-def update_cycle(active):
+def update_cycle(g, active):
     active.fig.data = []
     active.add_trace()
     if active.trace_type == 'Bar' and active.color_by_column is not None:
@@ -2804,11 +4302,87 @@ def update_cycle(active):
         g.fig.add_trace(active.fig.data[0])
 
 
-def serve_scatter(x_axis_column, y_axis_columns, dual=False):
+def reapply_conditions(active, settings: dict, df):
+    """Recomputes the per point styles conditional formatting gave ``active`` for the rows of
+    ``df``. Styles from earlier conditions, whose arguments are no longer kept, go back to the
+    trace's plain setting."""
+    for option, (attribute, setting) in active.conditional_attributes.items():
+        if not isinstance(getattr(active, attribute), np.ndarray):
+            continue
+        value = settings.get(setting)
+        if settings.get('Change') == option and settings.get('Column') in df.columns and settings.get('To'):
+            value = operators_change(df, settings['Operator'], value, settings['To'][0], settings['Column'],
+                                     settings['Condition'])
+        setattr(active, attribute, value)
+
+
+def rebind_graph(g, df, data_key=None):
+    """Points ``g`` and its traces at ``df`` and redraws the traces shown on the figure."""
+    # New rows change the figure's uirevision, so the browser autoscales; drop the zoom to match.
+    if data_key != g.data_key:
+        g.x_range, g.y_ranges = None, {}
+    g.df = df
+    g.data_key = data_key
+    shown = g.get_traces()
+    for name, entry in g.traces_dict.items():
+        entry['trace'].df = df
+        entry['trace'].data_key = data_key
+        entry['trace'].x_range, entry['trace'].y_ranges = g.x_range, g.y_ranges
+        reapply_conditions(entry['trace'], entry['settings'], df)
+        if name in shown:
+            g.delete_trace(name)
+            update_cycle(g, entry['trace'])
+
+
+def relayout_range(relayout_data: dict, axis: str, current):
+    """The range of ``axis`` after a relayout, None when autoscaled, ``current`` when it is unchanged."""
+    if relayout_data.get(f"{axis}.autorange"):
+        return None
+    if f"{axis}.range[0]" in relayout_data:
+        return relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"]
+    if f"{axis}.range" in relayout_data:
+        return tuple(relayout_data[f"{axis}.range"])
+    return current
+
+
+def zoom_traces(g, relayout_data: dict):
+    """Redraws the downsampled line traces and density scatter traces of ``g`` for the axis ranges
+    the graph was zoomed or panned to, at the same point budget or grid size. Stops the callback
+    when nothing needs redrawing."""
+    x_range = relayout_range(relayout_data, "xaxis", g.x_range)
+    y_ranges = {axis: relayout_range(relayout_data, axis, g.y_ranges.get(axis)) for axis in ("yaxis", "yaxis2")}
+    if not any(key.startswith(("xaxis.", "yaxis.", "yaxis2.")) for key in relayout_data):
+        raise PreventUpdate
+    x_changed = x_range != g.x_range
+    g.x_range = x_range
+    g.y_ranges = {axis: y_range for axis, y_range in y_ranges.items() if y_range is not None}
+    shown = g.get_traces()
+    redraw = []
+    for name, entry in g.traces_dict.items():
+        active = entry['trace']
+        if name not in shown:
+            continue
+        if active.trace_type == 'Line' and active.downsample != 'off' and x_changed:
+            redraw.append(active)
+        elif active.trace_type == 'Scatter' and active.render == 'density':
+            redraw.append(active)
+    if not redraw:
+        raise PreventUpdate
+    for active in redraw:
+        active.x_range = g.x_range
+        active.y_ranges = g.y_ranges
+        g.delete_trace(active.trace_name)
+        update_cycle(g, active)
+
+
+def serve_scatter(g, x_axis_column, y_axis_columns, dual=False):
     g.keep_active_traces(y_axis_columns)
     for y in y_axis_columns:
         if y not in g.get_traces():
-            scatter = Scatter(x_axis_column[0], {'name': y, 'dual': dual}, y)
+            scatter = Scatter(g.df, x_axis_column[0], {'name': y, 'dual': dual}, y)
+            scatter.data_key = g.data_key
+            scatter.x_range = g.x_range
+            scatter.y_ranges = g.y_ranges
             scatter.add_trace()
             g.fig.add_trace(scatter.fig.data[0])
             g.traces_dict[scatter.trace_name] = {'trace': scatter,
@@ -2818,6 +4392,7 @@ def serve_scatter(x_axis_column, y_axis_columns, dual=False):
                                                               'Opacity': scatter.opacity,
                                                               'Marker Border Width': scatter.border_width,
                                                               'Marker Border Color': scatter.border_color,
+                                                              'Render': scatter.render,
                                                               'Change': '',
                                                               'To': [],
                                                               'Column': '',
@@ -2828,12 +4403,14 @@ def serve_scatter(x_axis_column, y_axis_columns, dual=False):
                                                  }
 
 
-def serve_line(x_axis_column, y_axis_columns, trace, dual=False):
+def serve_line(g, x_axis_column, y_axis_columns, trace, dual=False):
     g.keep_active_traces(y_axis_columns)
     g.delete_trace(trace)
     for y in y_axis_columns:
         if y not in g.get_traces():
-            line = Line(x_axis_column[0], {'name': trace, 'dual': dual}, trace)
+            line = Line(g.df, x_axis_column[0], {'name': trace, 'dual': dual}, trace)
+            line.data_key = g.data_key
+            line.x_range = g.x_range
             line.add_trace()
             g.fig.add_trace(line.fig.data[0])
             g.traces_dict[line.trace_name] = {'trace': line,
@@ -2847,6 +4424,7 @@ def serve_line(x_axis_column, y_axis_columns, trace, dual=False):
                                                            'Mode': line.mode,
                                                            'Dash': line.dash,
                                                            'Connect Gaps': line.connectgaps,
+                                                           'Downsample': line.downsample,
                                                            'Change': '',
                                                            'To': [],
                                                            'Column': '',
@@ -2856,12 +4434,12 @@ def serve_line(x_axis_column, y_axis_columns, trace, dual=False):
                                                            }
                                               }
 
-def serve_bar(x_axis_column, y_axis_columns, trace, dual=False):
+def serve_bar(g, x_axis_column, y_axis_columns, trace, dual=False):
     g.keep_active_traces(y_axis_columns)
     g.delete_trace(trace)
     for y in y_axis_columns:
         if y not in g.get_traces():
-            bar = Bar(x_axis_column[0], {'name': trace, 'dual': dual}, trace)
+            bar = Bar(g.df, x_axis_column[0], {'name': trace, 'dual': dual}, trace)
             bar.add_trace()
             if bar.color_by_column is not None:
                 print('NOT NONE')
@@ -2900,40 +4478,39 @@ def serve_bar(x_axis_column, y_axis_columns, trace, dual=False):
                                               }
 
 
-def edit_scatter_options(changed_id: str, trace: str, active: object, settings: object, scatter_options: dict):
+def edit_scatter_options(g: Graph, changed_id: str, trace: str, active: object, settings: object, scatter_options: dict):
     if 'scatter_marker_style_dropdown' in changed_id:
-        g.delete_trace(trace, True)
         active.marker_symbol = scatter_options['Marker Symbol']
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Symbol'] = scatter_options['Marker Symbol']
     elif 'scatter_colorpicker' in changed_id:
-        g.delete_trace(trace, True)
         active.marker_color = scatter_options['Marker Color']
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Color'] = scatter_options['Marker Color']
     elif 'scatter_marker_size' in changed_id:
-        g.delete_trace(trace, True)
         active.marker_size = float(scatter_options['Marker Size'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Size'] = float(scatter_options['Marker Size'])
     elif 'scatter_opacity' in changed_id:
-        g.delete_trace(trace, True)
         active.opacity = float(scatter_options['Opacity'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Opacity'] = float(scatter_options['Opacity'])
     elif 'scatter_border_width' in changed_id:
-        g.delete_trace(trace, True)
         active.border_width = float(scatter_options['Marker Border Width'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Border Width'] = float(scatter_options['Marker Border Width'])
     elif 'scatter_colorpicker_marker_border' in changed_id:
-        g.delete_trace(trace, True)
         active.border_color = scatter_options['Marker Border Color']
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Border Width'] = scatter_options['Marker Border Color']
+    elif 'scatter_render_dropdown' in changed_id:
+        g.delete_trace(trace, True)
+        active.render = scatter_options['Render']
+        update_cycle(g, active)
+        settings['Render'] = scatter_options['Render']
 
 
-def scatter_conditional_options(active: object, trace: str, conditional_arguments: object,
+def scatter_conditional_options(g: Graph, active: object, trace: str, conditional_arguments: object,
                                 scatter_options: object, all_y_columns: list):
     # Need to refactor this function, too much happening in one function, split into multiple smaller or simplify operators_change so that there is less repitition overall.
     option = conditional_arguments.change_option
@@ -2954,7 +4531,7 @@ def scatter_conditional_options(active: object, trace: str, conditional_argument
         active.border_width = new_formatting
     elif option == 'Marker Border Color':
         active.border_color = new_formatting
-    update_cycle(active)
+    update_cycle(g, active)
 
     for y in all_y_columns:
         if trace not in ['', None] and y not in g.get_traces():
@@ -2970,6 +4547,7 @@ def scatter_conditional_options(active: object, trace: str, conditional_argument
                         'Marker Border Width': float(
                             scatter_options['Marker Border Width']),
                         'Marker Border Color': scatter_options['Marker Border Color'],
+                        'Render': scatter_options['Render'],
                         'Change': conditional_arguments.change_option,
                         'To': conditional_arguments.change_to,
                         'Column': conditional_arguments.col,
@@ -2978,49 +4556,46 @@ def scatter_conditional_options(active: object, trace: str, conditional_argument
                         }
 
 
-def edit_line_options(changed_id: str, trace: str, active: object, settings: object, line_options: dict):
+def edit_line_options(g: Graph, changed_id: str, trace: str, active: object, settings: object, line_options: dict):
     if 'line_width' in changed_id:
-        g.delete_trace(trace, True)
         active.width = float(line_options['Line Width'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Line Width'] = float(line_options['Line Width'])
     elif 'line_colorpicker' in changed_id:
-        g.delete_trace(trace, True)
         active.line_color = line_options['Line Color']
-        update_cycle(active)
+        active.restyle(g)
         settings['Line Color'] = line_options['Line Color']
     elif 'line_mode_dropdown' in changed_id:
-        g.delete_trace(trace, True)
         active.mode = line_options['Line Mode']
-        update_cycle(active)
+        active.restyle(g)
         settings['Mode'] = line_options['Line Mode']
     elif 'line_opacity' in changed_id:
-        g.delete_trace(trace, True)
         active.opacity = float(line_options['Opacity'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Opacity'] = float(line_options['Opacity'])
     elif 'line_marker_style_dropdown' in changed_id:
-        g.delete_trace(trace, True)
         active.marker_symbol = line_options['Marker Symbol']
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Symbol'] = line_options['Marker Symbol']
     elif 'line_marker_size' in changed_id:
-        g.delete_trace(trace, True)
         active.marker_size = float(line_options['Marker Size'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Marker Size'] = float(line_options['Marker Size'])
     elif 'line_dash_dropdown' in changed_id:
-        g.delete_trace(trace, True)
         active.dash = line_options['Dash']
-        update_cycle(active)
+        active.restyle(g)
         settings['Dash'] = line_options['Dash']
     elif 'line_gaps_dropdown' in changed_id:
-        g.delete_trace(trace, True)
         active.connectgaps = line_options['Line Gaps']
-        update_cycle(active)
+        active.restyle(g)
         settings['Connect Gaps'] = line_options['Line Gaps']
+    elif 'line_downsample_dropdown' in changed_id:
+        g.delete_trace(trace, True)
+        active.downsample = line_options['Downsample']
+        update_cycle(g, active)
+        settings['Downsample'] = line_options['Downsample']
 
-def line_conditional_options(active: object, trace: str, conditional_arguments: object,
+def line_conditional_options(g: Graph, active: object, trace: str, conditional_arguments: object,
                                 line_options: object, all_y_columns: list):
     # Need to refactor this function, too much happening in one function, split into multiple smaller or simplify operators_change so that there is less repitition overall.
     option = conditional_arguments.change_option
@@ -3045,7 +4620,7 @@ def line_conditional_options(active: object, trace: str, conditional_arguments:
         active.dash = new_formatting
     elif option == 'Line Gaps':
         active.connectgaps = new_formatting
-    update_cycle(active)
+    update_cycle(g, active)
 
     for y in all_y_columns:
         if trace not in ['', None] and y not in g.get_traces():
@@ -3065,6 +4640,7 @@ def line_conditional_options(active: object, trace: str, conditional_arguments:
                                                'Mode': line_options['Line Mode'],
                                                'Dash': line_options['Dash'],
                                                'Connect Gaps': line_options['Line Gaps'],
+                                               'Downsample': line_options['Downsample'],
                                                 'Change': conditional_arguments.change_option,
                                                 'To': conditional_arguments.change_to,
                                                 'Column': conditional_arguments.col,
@@ -3073,31 +4649,28 @@ def line_conditional_options(active: object, trace: str, conditional_arguments:
 
                                                }
 
-def edit_bar_options(changed_id: str, trace: str, active: object, settings: object, bar_options: dict):
+def edit_bar_options(g: Graph, changed_id: str, trace: str, active: object, settings: object, bar_options: dict):
     if 'bar_width' in changed_id:
-        g.delete_trace(trace, True)
         active.width = float(bar_options['Bar Width'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Bar Width'] = float(bar_options['Bar Width'])
     elif 'bar_colorpicker' in changed_id:
-        g.delete_trace(trace, True)
         active.color = bar_options['Bar Color']
-        update_cycle(active)
+        active.restyle(g)
         settings['Bar Color'] = bar_options['Bar Color']
     elif 'bar_opacity' in changed_id:
-        g.delete_trace(trace, True)
         active.opacity = float(bar_options['Opacity'])
-        update_cycle(active)
+        active.restyle(g)
         settings['Opacity'] = float(bar_options['Opacity'])
     elif 'bar_mode_dropdown' in changed_id:
         g.delete_trace(trace, True)
         active.mode = bar_options['Mode']
-        update_cycle(active)
+        update_cycle(g, active)
         settings['Mode'] = bar_options['Mode']
     elif 'bar_color_by_column' in changed_id:
         g.delete_trace(trace, True)
         active.color_by_column = bar_options['color_by_column']
-        update_cycle(active)
+        update_cycle(g, active)
         settings['color_by_column'] = bar_options['color_by_column']
         #bar_color_by_column
 
@@ -3120,6 +4693,7 @@ def edit_bar_options(changed_id: str, trace: str, active: object, settings: obje
     Input(f"scatter_opacity", "value"),
     Input(f"scatter_border_width", "value"),
     Input(f"scatter_colorpicker_marker_border", "value"),
+    Input("scatter_render_dropdown", "value"),
     # Line Graph Inputs
     Input("line_width", "value"),
     Input("line_colorpicker", "value"),
@@ -3129,6 +4703,7 @@ def edit_bar_options(changed_id: str, trace: str, active: object, settings: obje
     Input('line_marker_size', 'value'),
     Input("line_dash_dropdown", "value"),
     Input("line_gaps_dropdown", "value"),
+    Input("line_downsample_dropdown", "value"),
     #Bar Graph Inputs
     Input("bar_width", "value"),
     Input('bar_colorpicker', 'value'),
@@ -3145,7 +4720,12 @@ def edit_bar_options(changed_id: str, trace: str, active: object, settings: obje
 
     Input(f"dual-y-slider-container", 'n_clicks'),
     Input(f"secondary-yaxis-column", 'value'),
-    Input(f"trace_dropdown", 'value')
+    Input(f"trace_dropdown", 'value'),
+    Input("dataset-version", "data"),
+    Input("link-table-filter", "value"),
+    Input("table-sorting-filtering", "filter_query"),
+    Input("indicator-graphic", "relayoutData"),
+    State("session", "data"),
 )
 def update_graph(
         xaxis_column_name,
@@ -3161,6 +4741,7 @@ def update_graph(
         opacity,
         marker_border_width,
         marker_border_color,
+        scatter_render,
         line_width,
         line_color,
         line_opacity,
@@ -3169,6 +4750,7 @@ def update_graph(
         line_marker_size,
         line_dash,
         line_gaps,
+        line_downsample,
         bar_width,
         bar_color,
         bar_opacity,
@@ -3181,8 +4763,15 @@ def update_graph(
         condition,
         secondary_y_clicks,
         secondary_yaxis_columns,
-        trace
+        trace,
+        dataset_version,
+        linked,
+        table_filter,
+        relayout_data,
+        session_id,
 ):
+    session = get_session(session_id)
+    g = session.g
     y_axis_dict = [
         dict(zip(("name", "dual"), option))
         for option in zip((yaxis_column_name, secondary_yaxis_columns), (False, True))
@@ -3199,6 +4788,7 @@ def update_graph(
         "Opacity": opacity,
         "Marker Border Width": marker_border_width,
         "Marker Border Color": marker_border_color,
+        "Render": scatter_render,
     }
     line_options = {
         'Line Width': line_width,
@@ -3208,7 +4798,8 @@ def update_graph(
         'Marker Symbol': line_marker_style,
         "Marker Size": line_marker_size,
         'Dash': line_dash,
-        'Line Gaps': line_gaps
+        'Line Gaps': line_gaps,
+        'Downsample': line_downsample,
     }
     bar_options = {
         'Bar Width':bar_width,
@@ -3218,10 +4809,19 @@ def update_graph(
         'color_by_column': bar_column_by_color
     }
 
-    dff = df.copy()
-
     changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
 
+    linked = "link" in (linked or [])
+    if "table-sorting-filtering" in changed_id and not linked:
+        raise PreventUpdate
+    link_graph(session, parse_filter(table_filter or "") if linked else ())
+    dff = g.df
+    # Keep the user's zoom when the figure is sent again, until the plotted rows change.
+    g.fig.update_layout(uirevision=str(g.data_key))
+    if "indicator-graphic.relayoutData" in changed_id:
+        zoom_traces(g, relayout_data or {})
+        return g.fig, trace_options
+
     ####################################################################################################################
     # Edit Traces (no conditional)
 
@@ -3229,13 +4829,13 @@ def update_graph(
         active = g.traces_dict[trace]['trace']
         settings = g.traces_dict[trace]['settings']
         if active.trace_type == 'Scatter':
-            edit_scatter_options(changed_id, trace, active, settings, scatter_options)
+            edit_scatter_options(g, changed_id, trace, active, settings, scatter_options)
         elif active.trace_type == 'Line':
-            edit_line_options(changed_id, trace, active, settings, line_options)
+            edit_line_options(g, changed_id, trace, active, settings, line_options)
         elif active.trace_type == 'Bar':
             # print(g.get_traces())
             # g.delete_trace(trace)
-            edit_bar_options(changed_id, trace, active, settings, bar_options)
+            edit_bar_options(g, changed_id, trace, active, settings, bar_options)
             # print('after deleting')
             # print(g.get_traces())
     ####################################################################################################################
@@ -3254,51 +4854,51 @@ def update_graph(
                                           ['change_option', 'dff', 'operator', 'change_to', 'col', 'condition'])
         conditional_arguments = ConditionalArguments(change_option, dff, operator, change_to, col, condition)
         if active.trace_type == 'Scatter':
-            scatter_conditional_options(active, trace, conditional_arguments, scatter_options, all_y_columns)
+            scatter_conditional_options(g, active, trace, conditional_arguments, scatter_options, all_y_columns)
         elif active.trace_type == 'Line':
-            line_conditional_options(active, trace, conditional_arguments, line_options, all_y_columns)
+            line_conditional_options(g, active, trace, conditional_arguments, line_options, all_y_columns)
 
     ####################################################################################################################
 
     if "btn_sidebar_lines" in changed_id and len(xaxis_column_name) > 0 and trace not in ['', None]:
         ####################################################################################################################
         if trace in yaxis_column_name:
-            serve_line(xaxis_column_name, all_y_columns, trace, dual=False)
+            serve_line(g, xaxis_column_name, all_y_columns, trace, dual=False)
         elif trace in secondary_yaxis_columns:
-            serve_line(xaxis_column_name, all_y_columns, trace, dual=True)
+            serve_line(g, xaxis_column_name, all_y_columns, trace, dual=True)
 
     if "btn_sidebar_bar" in changed_id and len(xaxis_column_name) > 0 and trace not in ['', None]:
         ####################################################################################################################
         if trace in yaxis_column_name:
-            serve_bar(xaxis_column_name, all_y_columns, trace, dual=False)
+            serve_bar(g, xaxis_column_name, all_y_columns, trace, dual=False)
         elif trace in secondary_yaxis_columns:
-            serve_bar(xaxis_column_name, all_y_columns, trace, dual=True)
+            serve_bar(g, xaxis_column_name, all_y_columns, trace, dual=True)
 
     elif "btn_sidebar_scatter" in changed_id and len(xaxis_column_name) > 0 and trace not in ['', None]:
         print('scatter button clicked')
         if trace in yaxis_column_name:
             g.delete_trace(trace)
-            serve_scatter(xaxis_column_name, all_y_columns, dual=False)
+            serve_scatter(g, xaxis_column_name, all_y_columns, dual=False)
         elif trace in secondary_yaxis_columns:
             g.delete_trace(trace)
-            serve_scatter(xaxis_column_name, all_y_columns, dual=True)
+            serve_scatter(g, xaxis_column_name, all_y_columns, dual=True)
 
     elif "btn_sidebar_bar" in changed_id:
         fig = bar_chart(dff, xaxis_column_name, yaxis_column_name)
     elif "btn_sidebar_area" in changed_id:
-        fig = area_chart(dff, xaxis_column_name, yaxis_column_name)
+        fig = area_chart(session.fig, dff, xaxis_column_name, yaxis_column_name)
     elif "btn_sidebar_box" in changed_id:
-        fig = box_plot(dff, xaxis_column_name, yaxis_column_name)
+        fig = box_plot(session.fig, dff, xaxis_column_name, yaxis_column_name)
 
         # Secondary Y Axis default graph
     elif 'secondary-yaxis-column' in changed_id and len(xaxis_column_name) > 0:
         print('secondary y scatter')
-        serve_scatter(xaxis_column_name, all_y_columns, dual=True)
+        serve_scatter(g, xaxis_column_name, all_y_columns, dual=True)
         # Normal Y Axis default graph
     elif 'yaxis-column' in changed_id and len(xaxis_column_name) > 0:
         print('normal y scatter')
         print(changed_id)
-        serve_scatter(xaxis_column_name, all_y_columns, dual=False)
+        serve_scatter(g, xaxis_column_name, all_y_columns, dual=False)
 
     return g.fig, trace_options
 
@@ -3333,14 +4933,15 @@ def update_graph(
     Input('btn_sidebar_scatter', 'n_clicks'),
     Input('btn_sidebar_lines', 'n_clicks'),
     Input("btn_sidebar_bar", "n_clicks"),
-    Input('trace_dropdown', 'value')
+    Input('trace_dropdown', 'value'),
+    State("session", "data"),
 )
-def serve_graph_formatting_options(scatter_nclicks, lines_nclicks, bar_nclicks, trace):
+def serve_graph_formatting_options(scatter_nclicks, lines_nclicks, bar_nclicks, trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
     time.sleep(0.05)
     changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     show = {'display': "block"}
     hide = {'display': 'none'}
     print(f'CHANGED_ID {changed_id}')
@@ -3392,19 +4993,20 @@ def serve_graph_formatting_options(scatter_nclicks, lines_nclicks, bar_nclicks,
         Output(f"scatter_opacity", "value"),
         Output(f"scatter_border_width", "value"),
         Output(f"scatter_colorpicker_marker_border", "value"),
-
+        Output("scatter_render_dropdown", "value"),
     ],
-    Input(f"trace_dropdown", 'value')
+    Input(f"trace_dropdown", 'value'),
+    State("session", "data"),
 )
-def update_scatter_panel_data(trace):
+def update_scatter_panel_data(trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     if trace_object['trace'].trace_type != "Scatter":
         raise PreventUpdate
     settings = trace_object['settings']
     return [settings['Marker Size'], settings['Marker Symbol'], settings['Marker Color'], settings['Opacity'],
-            settings['Marker Border Width'], settings['Marker Border Color']]
+            settings['Marker Border Width'], settings['Marker Border Color'], settings.get('Render', 'points')]
 
 
 @app.callback(
@@ -3418,19 +5020,21 @@ def update_scatter_panel_data(trace):
         Output('line_marker_size', 'value'),
         Output("line_dash_dropdown", "value"),
         Output("line_gaps_dropdown", "value"),
-
+        Output("line_downsample_dropdown", "value"),
     ],
-    Input(f"trace_dropdown", 'value')
+    Input(f"trace_dropdown", 'value'),
+    State("session", "data"),
 )
-def update_line_panel_data(trace):
+def update_line_panel_data(trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     if trace_object['trace'].trace_type != "Line":
         raise PreventUpdate
     settings = trace_object['settings']
     return [settings['Line Width'], settings['Line Color'], settings['Opacity'], settings['Mode'],
-            settings['Marker Symbol'], settings['Marker Size'],settings['Dash'],settings['Connect Gaps']]
+            settings['Marker Symbol'], settings['Marker Size'],settings['Dash'],settings['Connect Gaps'],
+            settings.get('Downsample', 'lttb')]
 
 @app.callback(
     [
@@ -3442,12 +5046,13 @@ def update_line_panel_data(trace):
         Output('bar_color_by_column', 'value')
 
     ],
-    Input("trace_dropdown", 'value')
+    Input("trace_dropdown", 'value'),
+    State("session", "data"),
 )
-def update_bar_panel_data(trace):
+def update_bar_panel_data(trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     if trace_object['trace'].trace_type != "Bar":
         raise PreventUpdate
     settings = trace_object['settings']
@@ -3463,24 +5068,26 @@ def update_bar_panel_data(trace):
         Output(f"conditional-change-columns", "value"),
         Output(f"conditional-value", "value"),
     ],
-    Input(f"trace_dropdown", 'value')
+    Input(f"trace_dropdown", 'value'),
+    State("session", "data"),
 )
-def update_conditional_panel_data(trace):
+def update_conditional_panel_data(trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     settings = trace_object['settings']
     return [settings['Change'], settings['Operator'], settings['Column'], settings['Condition']]
 
 
 @app.callback(
     Output({"type": "change_to", "index": ALL}, "value"),
-    Input(f"trace_dropdown", 'value')
+    Input(f"trace_dropdown", 'value'),
+    State("session", "data"),
 )
-def update_change_to(trace):
+def update_change_to(trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    settings = g.traces_dict[trace]['settings']
+    settings = get_session(session_id).g.traces_dict[trace]['settings']
     # print(f'trace check {trace}')
     # print(f'trace To {settings["To"]}')
     if len(settings['To']) == 0:
@@ -3494,13 +5101,14 @@ def update_change_to(trace):
     Output('conditional-change-options', 'options'),
     Input('btn_sidebar_scatter', 'n_clicks'),
     Input('btn_sidebar_lines', 'n_clicks'),
-    Input('trace_dropdown', 'value')
+    Input('trace_dropdown', 'value'),
+    State("session", "data"),
 )
-def update_conditional_change_options(scatter_btn, line_btn, trace):
+def update_conditional_change_options(scatter_btn, line_btn, trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
     changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     if trace_object['trace'].trace_type == 'Line' or 'btn_sidebar_lines' in changed_id:
         return line_conditional_dropdown_options()
     elif trace_object['trace'].trace_type == "Scatter" or 'btn_sidebar_scatter' in changed_id:
@@ -3513,40 +5121,181 @@ def update_conditional_change_options(scatter_btn, line_btn, trace):
     Output("conditional-change-columns", "options"),
     Output('bar_color_by_column','options'),
     Input("output-data-upload", "children"),
+    State("session", "data"),
 )
-def update_conditional_cols(contents):
-    return df_column_dropdown_options(),df_column_dropdown_options()
+def update_conditional_cols(contents, session_id):
+    df = get_session(session_id).df
+    return df_column_dropdown_options(df),df_column_dropdown_options(df)
 
 
 @app.callback(
     Output("conditional-change-to", "children"),
     Input("conditional-change-options", "value"),
-    State('trace_dropdown', 'value')
+    State('trace_dropdown', 'value'),
+    State("session", "data"),
 )
-def update_change_to_options(option, trace):
+def update_change_to_options(option, trace, session_id):
     if trace in ['', None]:
         raise PreventUpdate
-    trace_object = g.traces_dict[trace]
+    trace_object = get_session(session_id).g.traces_dict[trace]
     # if trace_object['trace'].trace_type == "Scatter":
     return conditional_change_to_options(option)
 
 
 @app.callback(
-    [Output("output-data-upload", "children"), Output("upload-data", "style")],
+    [
+        Output("dataset-dropdown", "options"),
+        Output("dataset-dropdown", "value"),
+        Output("dataset-dropdown", "style"),
+        Output("upload-status", "children"),
+        Output("upload-data", "style"),
+        Output("excel-workbooks", "data"),
+        Output("excel-picker", "style"),
+        Output("excel-workbook", "options"),
+        Output("excel-workbook", "value"),
+    ],
     Input("upload-data", "contents"),
+    Input("excel-load", "n_clicks"),
     State("upload-data", "filename"),
     State("upload-data", "last_modified"),
+    State("session", "data"),
+    State("excel-workbooks", "data"),
+    State("excel-workbook", "value"),
+    State("excel-sheet", "value"),
+    State("excel-columns", "value"),
 )
-def update_output(list_of_contents, list_of_names, list_of_dates):
-    if list_of_contents is not None:
-        children = [
-            parse_contents(c, n, d)
-            for c, n, d in zip(list_of_contents, list_of_names, list_of_dates)
-        ]
-        return children, {"display": "none"}
+def update_output(list_of_contents, load_clicks, list_of_names, list_of_dates, session_id,
+                  workbooks, workbook, sheet, columns):
+    changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
+    workbooks = dict(workbooks or {})
+    if "excel-load" in changed_id:
+        if not load_clicks or workbook not in workbooks or sheet is None:
+            raise PreventUpdate
+        try:
+            results = [(f"{workbook} [{sheet}]", read_workbook_sheet(workbooks[workbook], sheet, columns))]
+        except Exception as e:
+            results = [(f"{workbook} [{sheet}]", e)]
+    elif list_of_contents is not None:
+        results = read_single_sheets(parse_uploads(list_of_contents, list_of_names))
     else:
         raise PreventUpdate
 
+    session = sessions.get(session_id)
+    datasets = collections.OrderedDict(session.datasets if session is not None else {})
+    errors = []
+    added = []
+    staged = []
+    for filename, result in results:
+        if isinstance(result, Exception):
+            print(result)
+            errors.append(html.Div([f"There was an error processing {filename}."]))
+            continue
+        if isinstance(result, dict) and len(result["sheets"]) > 1:
+            workbooks[filename] = result
+            staged.append(filename)
+            continue
+        # Uploading the same file again reuses its dataset instead of adding a copy.
+        name = filename if datasets.get(filename) == result else dataset_name(filename, datasets)
+        datasets[name] = result
+        added.append(name)
+
+    picker_style = {"display": "block" if workbooks else "none", "width": "800px"}
+    workbook_options = [{"label": name, "value": name} for name in workbooks]
+    workbook_value = staged[0] if staged else dash.no_update
+    if not added:
+        upload_style = {"display": "none"} if staged else dash.no_update
+        return (dash.no_update, dash.no_update, dash.no_update, errors, upload_style,
+                workbooks, picker_style, workbook_options, workbook_value)
+    sessions.open(session_id, datasets, added[0])
+    options = [{"label": name, "value": name} for name in datasets]
+    return (options, added[0], {"display": "block" if len(datasets) > 1 else "none"}, errors, {"display": "none"},
+            workbooks, picker_style, workbook_options, workbook_value)
+
+
+@app.callback(
+    Output("excel-sheet", "options"),
+    Output("excel-sheet", "value"),
+    Input("excel-workbook", "value"),
+    State("excel-workbooks", "data"),
+)
+def update_excel_sheets(workbook, workbooks):
+    if not workbooks or workbook not in workbooks:
+        raise PreventUpdate
+    sheets = list(workbooks[workbook]["sheets"])
+    return [{"label": name, "value": name} for name in sheets], sheets[0]
+
+
+@app.callback(
+    Output("excel-columns", "options"),
+    Output("excel-columns", "value"),
+    Input("excel-sheet", "value"),
+    State("excel-workbook", "value"),
+    State("excel-workbooks", "data"),
+)
+def update_excel_columns(sheet, workbook, workbooks):
+    if not workbooks or workbook not in workbooks or sheet not in workbooks[workbook]["sheets"]:
+        raise PreventUpdate
+    headers = workbooks[workbook]["sheets"][sheet]
+    return [{"label": name, "value": i} for i, name in enumerate(headers)], []
+
+
+@app.callback(
+    Output("output-data-upload", "children"),
+    Input("dataset-dropdown", "value"),
+    State("session", "data"),
+)
+def render_dataset(name, session_id):
+    if session_id and sessions.get(session_id) is None and sessions.expired(session_id):
+        return html.Div([DATASET_EXPIRED_MESSAGE], style={"color": "red"})
+    session = get_session(session_id)
+    if name not in session.datasets:
+        raise PreventUpdate
+    if name != session.active:
+        session = sessions.open(session_id, session.datasets, name)
+    return serve_dataset_layout(session)
+
+
+DATASET_EXPIRED_MESSAGE = "This dataset has expired from the server's cache, please upload it again."
+
+
+@app.callback(
+    Output("dataset-expired", "children"),
+    Input("dataset-expiry-interval", "n_intervals"),
+    State("session", "data"),
+)
+def check_dataset_expired(n_intervals, session_id):
+    # Other callbacks stop quietly without a session, this one tells the user why.
+    if not session_id or sessions.get(session_id) is not None or not sessions.expired(session_id):
+        raise PreventUpdate
+    return DATASET_EXPIRED_MESSAGE
+
+
+@app.callback(
+    Output("load-progress", "value"),
+    Output("load-progress", "children"),
+    Output("load-progress-status", "children"),
+    Output("load-progress-container", "style"),
+    Output("load-progress-interval", "disabled"),
+    Output("dataset-version", "data"),
+    Output("dataset-memory", "children"),
+    Output("profile-table", "data"),
+    Input("load-progress-interval", "n_intervals"),
+    State("session", "data"),
+)
+def poll_load_progress(n_intervals, session_id):
+    # get_session swaps the preview for the full dataset as soon as it is in the store.
+    session = get_session(session_id)
+    if not session.dataset_key.endswith(PREVIEW_SUFFIX):
+        return (100, "", dash.no_update, {"display": "none"}, True, session.dataset_key,
+                memory_summary(session), profile_records(dataset_profile(session)))
+    job = read_job(session.dataset_key[:-len(PREVIEW_SUFFIX)])
+    if job is None or job["status"] == "error":
+        return (dash.no_update, dash.no_update, f"There was an error loading the rest of {session.active}.",
+                dash.no_update, True, dash.no_update, dash.no_update, dash.no_update)
+    percent = int(100 * job["progress"])
+    return (percent, f"{percent}%", dash.no_update, dash.no_update, False, dash.no_update, dash.no_update,
+            dash.no_update)
+
 
 def split_filter_part(filter_part):
     for operator_type in operators:
@@ -3559,6 +5308,9 @@ def split_filter_part(filter_part):
                 v0 = value_part[0]
                 if v0 == value_part[-1] and v0 in ("'", '"', "`"):
                     value = value_part[1:-1].replace("\\" + v0, v0)
+                elif operator_type[0] in ("contains ", "datestartswith "):
+                    # Text operators match the text as typed, 02139 or 1234567 included.
+                    value = value_part
                 else:
                     try:
                         value = float(value_part)
@@ -3582,56 +5334,499 @@ operators = [
 ]
 
 
+##########################################Table queries#################################################################
+
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("VIZTOOL_QUERY_CACHE_MB", 256)) * 1024 ** 2
+# contains filters match literally unless set.
+FILTER_REGEX = os.environ.get("VIZTOOL_FILTER_REGEX", "") not in ("", "0")
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_filter(filter_query: str) -> tuple:
+    """The ``(column, operator, value)`` clauses of a DataTable ``filter_query``. Clauses are
+    and-ed together, so their order and repeats are dropped to let equal filters share a cache entry."""
+    clauses = set()
+    for filter_part in filter_query.split(" && "):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if operator is not None:
+            clauses.add((col_name, operator, filter_value))
+    return tuple(sorted(clauses, key=repr))
+
+
+# Text columns with more distinct values than this share of their rows gain nothing from testing
+# each distinct value once, so substring filters scan them instead of building a TextIndex.
+TEXT_INDEX_MAX_RATIO = 0.5
+
+
+def text_matches(texts: np.ndarray, value: str, regex: bool = False) -> np.ndarray:
+    """Which of the strings ``texts`` contain ``value``."""
+    if regex:
+        return pd.Series(texts, dtype=object).str.contains(value, regex=True).to_numpy(dtype=bool)
+    # Plain substring tests are about twice as fast in a loop as through the str accessor.
+    return np.fromiter((value in text for text in texts), dtype=bool, count=len(texts))
+
+
+def text_indexed(series: pd.Series) -> bool:
+    """Whether substring filters of ``series`` go through a TextIndex. Dates and numbers always do,
+    so their printed form is only built once."""
+    if series.dtype.name != "category":
+        return True
+    return len(series.cat.categories) <= TEXT_INDEX_MAX_RATIO * len(series)
+
+
+def text_scan(series: pd.Series, value: str, regex: bool = False) -> np.ndarray:
+    hits = np.zeros(len(series), dtype=bool)
+    present = series.notna().to_numpy()
+    texts = series.to_numpy(dtype=object)[present]
+    if pd.api.types.infer_dtype(texts, skipna=False) != "string":
+        texts = texts.astype(str).astype(object)
+    hits[present] = text_matches(texts, value, regex)
+    return hits
+
+
+class TextIndex:
+    """The distinct values of a column as the table prints them, sorted, and the position of every
+    row's value among them (-1 when missing).
+
+    Text filters test each distinct value once and pick rows by position, and a prefix is a
+    contiguous range of the sorted values, so neither scans the column's strings.
+    """
+
+    def __init__(self, series: pd.Series):
+        if series.dtype.name == "category":
+            codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series)
+        texts = text_column(pd.Series(uniques)).astype(str).to_numpy(dtype=object)
+        order = np.argsort(texts, kind="stable")
+        positions = np.empty(len(order) + 1, dtype=codes_dtype(len(order)))
+        positions[order] = np.arange(len(order))
+        positions[-1] = -1
+        self.values = texts[order]
+        self.codes = positions[codes]
+        self.nbytes = self.codes.nbytes + self.values.nbytes + sum(len(text) for text in self.values)
+
+    def contains(self, value: str, rows: np.ndarray = None, regex: bool = False) -> np.ndarray:
+        codes = self._codes(rows)
+        # Missing values have position -1, which picks the trailing False.
+        hits = np.zeros(len(self.values) + 1, dtype=bool)
+        if rows is None or len(rows) >= len(self.values):
+            hits[:-1] = text_matches(self.values, value, regex)
+        else:
+            # Refining a narrower filter only tests the values its rows hold.
+            present = np.unique(codes[codes >= 0])
+            hits[present] = text_matches(self.values[present], value, regex)
+        return hits[codes]
+
+    def startswith(self, value: str, rows: np.ndarray = None) -> np.ndarray:
+        start = np.searchsorted(self.values, value, side="left")
+        stop = np.searchsorted(self.values, value + "\U0010ffff", side="left")
+        codes = self._codes(rows)
+        return (codes >= start) & (codes < stop)
+
+    def _codes(self, rows):
+        return self.codes if rows is None else self.codes[rows]
+
+
+def clause_source(clause: tuple, df: pd.DataFrame) -> str:
+    if clause[1] == "datestartswith" or (clause[1] == "contains" and text_indexed(df[clause[0]])):
+        return "index"
+    return "scan"
+
+
+class QueryEngine:
+    """Positions of the rows of a dataset that match a table filter, in table sort order.
+
+    Filters, sorts, and the per-column ranks and text indexes they are built from are cached per
+    dataset key, and dropped least recently used first once they exceed ``max_bytes``, so paging
+    through a filtered or sorted table only slices cached rows.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, key: str, df: pd.DataFrame, clauses: tuple, plan: dict = None) -> np.ndarray:
+        """Positions of the rows matching every clause. ``plan`` is filled with where each clause's
+        rows came from and how long it all took, see ``update_table``."""
+        started = time.perf_counter()
+        rows = self._get(("filter", key, clauses))
+        if rows is not None:
+            steps = [(clause, "cache", 0) for clause in clauses]
+        else:
+            # Adding a clause to a cached filter only has to test the rows that filter kept.
+            base, rows = self._narrowest(key, clauses)
+            steps = [(clause, "cache", 0) for clause in base]
+            remaining = [clause for clause in clauses if clause not in base]
+            if rows is None:
+                mask = np.ones(len(df), dtype=bool)
+                for clause in remaining:
+                    mask &= self._mask(key, df, clause)
+                    steps.append((clause, clause_source(clause, df), len(df)))
+                rows = np.flatnonzero(mask).astype(codes_dtype(len(df)))
+            else:
+                for clause in remaining:
+                    steps.append((clause, clause_source(clause, df), len(rows)))
+                    rows = rows[self._mask(key, df, clause, rows)]
+            rows = self._put(("filter", key, clauses), rows)
+        if plan is not None:
+            plan["clauses"] = [
+                {"clause": f"{{{column}}} {operator} {value if isinstance(value, str) else np.format_float_positional(value, trim='-')}",
+                 "source": source, "rows_tested": tested}
+                for (column, operator, value), source, tested in steps
+            ]
+            plan.setdefault("timings_ms", {})["filter"] = 1000 * (time.perf_counter() - started)
+        return rows
+
+    def _mask(self, key: str, df: pd.DataFrame, clause: tuple, rows: np.ndarray = None) -> np.ndarray:
+        """Which of ``rows`` (all rows when None) match ``clause``."""
+        column, operator, value = clause
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            # these operators match pandas series operator method names
+            series = df[column] if rows is None else df[column].iloc[rows]
+            return np.asarray(compare_column(series, operator, value), dtype=bool)
+        if operator == "contains":
+            if not text_indexed(df[column]):
+                return text_scan(df[column] if rows is None else df[column].iloc[rows], value, regex=FILTER_REGEX)
+            return self.text_index(key, df, column).contains(value, rows, regex=FILTER_REGEX)
+        # datestartswith is a simplification of the front-end filtering logic,
+        # only works with complete fields in standard format
+        return self.text_index(key, df, column).startswith(value, rows)
+
+    def text_index(self, key: str, df: pd.DataFrame, column: str) -> TextIndex:
+        index = self._get(("text", key, column))
+        if index is None:
+            index = self._put(("text", key, column), TextIndex(df[column]))
+        return index
+
+    def sort(self, key: str, df: pd.DataFrame, clauses: tuple, sort_by: tuple, plan: dict = None) -> np.ndarray:
+        """``filter`` ordered by ``sort_by``, ``(column, ascending)`` pairs from the first sort key
+        to the last. Missing values come last, as with ``sort_values``."""
+        rows = self.filter(key, df, clauses, plan)
+        if not sort_by:
+            return rows
+        started = time.perf_counter()
+        sorted_rows = self._get(("sort", key, clauses, sort_by))
+        source = "cache"
+        if sorted_rows is None:
+            # lexsort sorts by its last key first.
+            sort_keys = [self._sort_key(key, df, column, ascending, rows) for column, ascending in reversed(sort_by)]
+            sorted_rows = self._put(("sort", key, clauses, sort_by), rows[np.lexsort(sort_keys)])
+            source = "lexsort"
+        if plan is not None:
+            plan["sort_source"] = source
+            plan.setdefault("timings_ms", {})["sort"] = 1000 * (time.perf_counter() - started)
+        return sorted_rows
+
+    def ranks(self, key: str, df: pd.DataFrame, column: str) -> np.ndarray:
+        """Dense ranks of the values of ``column`` in sorted order, -1 where they are missing."""
+        ranks = self._get(("ranks", key, column))
+        if ranks is None:
+            series = df[column]
+            if series.dtype.name == "category":
+                # Categories are kept sorted, see optimize_column.
+                ranks = series.cat.codes.to_numpy()
+            else:
+                ranks, _ = pd.factorize(series, sort=True)
+            ranks = self._put(("ranks", key, column), ranks.astype(codes_dtype(len(df))))
+        return ranks
+
+    def _sort_key(self, key: str, df: pd.DataFrame, column: str, ascending: bool, rows: np.ndarray) -> np.ndarray:
+        ranks = self.ranks(key, df, column)[rows].astype(np.int64)
+        missing = ranks < 0
+        last = ranks.max(initial=-1) + 1
+        if not ascending:
+            ranks = last - 1 - ranks
+        ranks[missing] = last
+        return ranks
+
+    def _narrowest(self, key: str, clauses: tuple):
+        """The cached filter made of some of ``clauses`` that kept the fewest rows, and those rows."""
+        best = ((), None)
+        with self._lock:
+            for cache_key, rows in self._cache.items():
+                if cache_key[0] != "filter" or cache_key[1] != key:
+                    continue
+                cached_clauses = cache_key[2]
+                if not cached_clauses or not set(cached_clauses) <= set(clauses):
+                    continue
+                if best[1] is None or len(rows) < len(best[1]):
+                    best = (cached_clauses, rows)
+        return best
+
+    def _get(self, cache_key):
+        with self._lock:
+            values = self._cache.get(cache_key)
+            if values is not None:
+                self._cache.move_to_end(cache_key)
+            return values
+
+    def _put(self, cache_key, values):
+        if isinstance(values, np.ndarray):
+            values.setflags(write=False)
+        with self._lock:
+            self._cache[cache_key] = values
+            self._cache.move_to_end(cache_key)
+            total = sum(cached.nbytes for cached in self._cache.values())
+            while total > self.max_bytes and len(self._cache) > 1:
+                _, dropped = self._cache.popitem(last=False)
+                total -= dropped.nbytes
+        return values
+
+
+query_engine = QueryEngine(QUERY_CACHE_MAX_BYTES)
+
+
+def link_graph(session: Session, clauses: tuple):
+    """Plots the session's traces from the rows matching the table filter ``clauses``, reusing
+    the rows the table already found. No clauses plots every row of the dataset."""
+    if clauses == session.graph_filter:
+        return
+    df, data_key = session.df, session.dataset_key
+    if clauses:
+        df = df.iloc[query_engine.filter(session.dataset_key, df, clauses)]
+        data_key = (session.dataset_key, clauses)
+    session.graph_filter = clauses
+    rebind_graph(session.g, df, data_key)
+
+
+# Plans of the latest table requests of this worker, served by /metrics/query-plans.
+query_plans = collections.deque(maxlen=int(os.environ.get("VIZTOOL_QUERY_PLAN_HISTORY", 100)))
+
+
+def describe_plan(plan: dict) -> str:
+    timings = plan["timings_ms"]
+    parts = [f"{row_count(plan['filtered_rows'], plan['total_rows'])} in {sum(timings.values()):.1f} ms"]
+    if plan["clauses"]:
+        clauses = ", ".join(
+            f"{clause['clause']}: {clause['source']}" + (f" of {clause['rows_tested']:,}" if clause["rows_tested"] else "")
+            for clause in plan["clauses"]
+        )
+        parts.append(f"filter {timings['filter']:.1f} ms ({clauses})")
+    if "sort" in timings:
+        parts.append(f"sort {timings['sort']:.1f} ms ({plan['sort_source']})")
+    parts.append(f"page {timings['page']:.1f} ms ({plan['page_source']})")
+    return " · ".join(parts)
+
+
+@server.route("/metrics/query-plans")
+def query_plan_metrics():
+    return flask.jsonify(list(query_plans))
+
+
+def table_records(df: pd.DataFrame, rows: np.ndarray, page: int, size: int) -> list:
+    return df.iloc[rows[page * size: (page + 1) * size]].to_dict("records")
+
+
+class WindowPrefetcher:
+    """Table windows built in a background thread before they are asked for."""
+
+    def __init__(self, max_windows: int):
+        self.max_windows = max_windows
+        self._windows = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def get(self, window):
+        """The records prefetched for ``window``, or None."""
+        with self._lock:
+            future = self._windows.pop(window, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(e)
+            return None
+
+    def prefetch(self, window, build):
+        with self._lock:
+            if window in self._windows:
+                return
+            self._windows[window] = self._executor.submit(build)
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+
+
+prefetched_windows = WindowPrefetcher(max_windows=16)
+
+
+@app.callback(
+    Output("table-sorting-filtering", "page_size"),
+    Output("table-sorting-filtering", "page_current"),
+    Output("table-sorting-filtering", "virtualization"),
+    Output("table-sorting-filtering", "fixed_rows"),
+    Output("table-sorting-filtering", "style_table"),
+    Input("table-scroll-mode", "value"),
+    prevent_initial_call=True,
+)
+def toggle_table_scroll_mode(mode):
+    """Scrolling serves ``TABLE_WINDOW_ROWS`` rows per request, and the browser only renders the
+    ones in view."""
+    if "scroll" in mode:
+        return (TABLE_WINDOW_ROWS, 0, True, {"headers": True},
+                {"overflowX": "auto", "overflowY": "auto", "height": "600px"})
+    return TABLE_PAGE_SIZE, 0, False, {"headers": False}, {"overflowX": "auto", "overflowY": "auto"}
+
+
 @app.callback(
     [
         Output("table-sorting-filtering", "data"),
         Output("table-sorting-filtering", "tooltip_data"),
+        Output("table-sorting-filtering", "page_count"),
+        Output("table-row-count", "children"),
+        Output("table-query-plan", "children"),
+        Output("table-query-plan-data", "data"),
     ],
     Input("table-sorting-filtering", "page_current"),
     Input("table-sorting-filtering", "page_size"),
     Input("table-sorting-filtering", "sort_by"),
     Input("table-sorting-filtering", "filter_query"),
+    Input("dataset-version", "data"),
+    State("table-sorting-filtering", "virtualization"),
+    State("session", "data"),
 )
-def update_table(page_current, page_size, sort_by, filter):
-    filtering_expressions = filter.split(" && ")
-    dff = df.copy()
-    for filter_part in filtering_expressions:
-        col_name, operator, filter_value = split_filter_part(filter_part)
-
-        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
-            # these operators match pandas series operator method names
-            dff = dff.loc[getattr(dff[col_name], operator)(filter_value)]
-        elif operator == "contains":
-            dff = dff.loc[dff[col_name].str.contains(filter_value)]
-        elif operator == "datestartswith":
-            # this is a simplification of the front-end filtering logic,
-            # only works with complete fields in standard format
-            dff = dff.loc[dff[col_name].str.startswith(filter_value)]
-
-    if len(sort_by):
-        dff = dff.sort_values(
-            [col["column_id"] for col in sort_by],
-            ascending=[col["direction"] == "asc" for col in sort_by],
-            inplace=False,
-        )
+def update_table(page_current, page_size, sort_by, filter, dataset_version, virtualization, session_id):
+    session = get_session(session_id)
+    df = session.df
+    clauses = parse_filter(filter)
+    sort = tuple((col["column_id"], col["direction"] == "asc") for col in sort_by)
+    plan = {"time": time.time(), "dataset": session.dataset_key, "filter": filter, "sort": [list(s) for s in sort]}
+    rows = query_engine.sort(session.dataset_key, df, clauses, sort, plan)
 
     page = page_current
     size = page_size
 
-    tooltip_data = [
-        {
-            column: {"value": str(value), "type": "markdown"}
-            for column, value in row.items()
-        }
-        for row in dff.to_dict("records")
-    ]
+    started = time.perf_counter()
+    records = prefetched_windows.get((session.dataset_key, clauses, sort, page, size))
+    plan["page_source"] = "prefetch"
+    if records is None:
+        records = table_records(df, rows, page, size)
+        plan["page_source"] = "built"
+    tooltips = table_tooltips(records)
+    plan["timings_ms"]["page"] = 1000 * (time.perf_counter() - started)
+    plan.update({"total_rows": len(df), "filtered_rows": len(rows)})
+    query_plans.append(plan)
+    if virtualization and (page + 1) * size < len(rows):
+        # Scrolling usually carries on to the next window.
+        prefetched_windows.prefetch(
+            (session.dataset_key, clauses, sort, page + 1, size),
+            functools.partial(table_records, df, rows, page + 1, size),
+        )
+    return (
+        records,
+        tooltips,
+        page_count(len(rows), size),
+        row_count(len(rows), len(df)),
+        describe_plan(plan),
+        plan,
+    )
 
-    return dff.iloc[page * size: (page + 1) * size].to_dict("records"), tooltip_data
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("VIZTOOL_EXPORT_CHUNK_ROWS", 50000))
+# pyarrow is optional, it is only imported once an Arrow export is asked for.
+ARROW_EXPORT = importlib.util.find_spec("pyarrow") is not None
+
+
+def export_url(session_id: str, fmt: str, filter_query: str, sort_by: list) -> str:
+    sort = [[col["column_id"], col["direction"]] for col in sort_by or []]
+    query = urllib.parse.urlencode({"filter": filter_query or "", "sort": json.dumps(sort)})
+    return f"/export/{session_id}.{fmt}?{query}"
+
+
+def csv_chunks(df: pd.DataFrame, rows: np.ndarray):
+    yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        yield df.iloc[rows[start:start + EXPORT_CHUNK_ROWS]].to_csv(index=False, header=False)
+
+
+def arrow_chunks(df: pd.DataFrame, rows: np.ndarray):
+    """The rows as an Arrow IPC stream, one record batch per chunk."""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    for i, field in enumerate(schema):
+        # Text columns are object columns, which give no type when empty.
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    writer = pa.ipc.new_stream(sink, schema)
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[rows[start:start + EXPORT_CHUNK_ROWS]]
+        writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+@server.route("/export/<session_id>.<fmt>")
+def export_table(session_id, fmt):
+    """Streams the active dataset of a session as the table shows it, filtered and sorted by the
+    ``filter`` and ``sort`` query arguments (see ``export_url``), a chunk at a time."""
+    session = sessions.get(session_id)
+    if session is None or fmt not in ("csv", "arrow"):
+        flask.abort(404)
+    if fmt == "arrow" and not ARROW_EXPORT:
+        flask.abort(501)
+    df = session.df
+    clauses = parse_filter(flask.request.args.get("filter", ""))
+    try:
+        sort = tuple((column, direction == "asc") for column, direction in json.loads(flask.request.args.get("sort", "[]"))
+                     if direction in ("asc", "desc"))
+    except (ValueError, TypeError):
+        flask.abort(400)
+    columns = set(map(str, df.columns))
+    if any(not isinstance(column, str) or column not in columns for column, _ in sort + tuple(clause[:2] for clause in clauses)):
+        flask.abort(400)
+    try:
+        rows = query_engine.sort(session.dataset_key, df, clauses, sort)
+    except (ValueError, TypeError):
+        # A filter value the column cannot be compared with.
+        flask.abort(400)
+    filename = re.sub(r"[^\w. ()-]", "_", pathlib.Path(session.active).stem) + (".csv" if fmt == "csv" else ".arrows")
+    return flask.Response(
+        csv_chunks(df, rows) if fmt == "csv" else arrow_chunks(df, rows),
+        mimetype="text/csv" if fmt == "csv" else "application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.callback(
+    Output("export-csv", "href"),
+    Output("export-arrow", "href"),
+    Input("table-sorting-filtering", "filter_query"),
+    Input("table-sorting-filtering", "sort_by"),
+    State("session", "data"),
+)
+def update_export_links(filter_query, sort_by, session_id):
+    if not session_id:
+        raise PreventUpdate
+    return (export_url(session_id, "csv", filter_query, sort_by),
+            export_url(session_id, "arrow", filter_query, sort_by))
 
 
 ##########################################Table filtering
 
 
+@app.callback(
+    Output("profile-collapse", "is_open"),
+    Input("profile-toggle", "n_clicks"),
+    State("profile-collapse", "is_open"),
+)
+def toggle_profile(n_clicks, is_open):
+    if n_clicks:
+        return not is_open
+    return is_open
+
+
 @app.callback(
     Output("modal-centered", "is_open"),
     [Input("open-centered", "n_clicks"), Input("close-centered", "n_clicks")],